@@ -0,0 +1,81 @@
+import pandas as pd
+
+from storage import to_cents
+
+
+class LimitMonitor:
+    # Running totals per (Month, Category), per card and per month, updated
+    # from mutation events. Each write only looks up the totals it touched,
+    # and listener(alerts) is called when one of them goes over its limit.
+    # Totals are kept in cents so they don't drift over many writes.
+    #   budget  - budget_limits.json, per category per month
+    #   credit  - credit_limits.json, per card over all time
+    #   monthly - monthly_budget.json, all spending in a month
+    def __init__(self, group_sum, limits):
+        # group_sum(keys) returns the ledger's Amount totals by keys;
+        # limits() returns the current {"budget", "credit", "monthly"} dicts.
+        self._group_sum = group_sum
+        self._limits = limits
+        self._totals = None
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _build(self):
+        self._totals = {
+            "budget": to_cents(self._group_sum(["Month", "Category"])).to_dict(),
+            "credit": to_cents(self._group_sum(["Source"])).to_dict(),
+            "monthly": to_cents(self._group_sum(["Month"])).to_dict(),
+        }
+
+    @staticmethod
+    def _deltas(before, after):
+        rows = [frame.assign(Amount=sign * to_cents(frame["Amount"])) for frame, sign in ((before, -1), (after, 1))
+                if frame is not None and not frame.empty]
+        if not rows:
+            return None
+        rows = pd.concat(rows, ignore_index=True)
+        rows["Month"] = rows["Date"].dt.to_period("M")
+        return {
+            "budget": rows.groupby(["Month", "Category"], observed=True)["Amount"].sum().to_dict(),
+            "credit": rows.groupby("Source", observed=True)["Amount"].sum().to_dict(),
+            "monthly": rows.groupby("Month")["Amount"].sum().to_dict(),
+        }
+
+    def on_ledger_changed(self, event, before, after):
+        if event == "reset" or not self._listeners:
+            self._totals = None
+            return
+        deltas = self._deltas(before, after)
+        if deltas is None:
+            return
+        if self._totals is None:
+            # The ledger already includes this write, so build from it and
+            # work out the previous totals from the deltas.
+            self._build()
+        else:
+            for kind, changes in deltas.items():
+                totals = self._totals[kind]
+                for key, change in changes.items():
+                    totals[key] = totals.get(key, 0) + change
+
+        limits = self._limits()
+        alerts = []
+        for kind, changes in deltas.items():
+            for key, change in changes.items():
+                if kind == "budget":
+                    limit = limits["budget"].get(key[1])
+                elif kind == "monthly":
+                    limit = limits["monthly"].get(str(key))
+                else:
+                    limit = limits["credit"].get(key)
+                total = self._totals[kind].get(key, 0)
+                if limit is not None and total - change <= round(float(limit) * 100) < total:
+                    alerts.append({"kind": kind, "key": key, "total": total / 100, "limit": limit})
+        if alerts:
+            for listener in list(self._listeners):
+                listener(alerts)
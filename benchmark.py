@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNS
+
+# Benchmarks the model and controller hot paths on synthetic ledgers:
+#   python benchmark.py --sizes 10k 100k 1M --output bench.json
+#   python benchmark.py --sizes 100k --compare bench.json
+# Each size runs in a scratch directory, since the model keeps its files in
+# the working directory.
+
+SOURCES = [
+    "Cash", "Chase Debit", "Discover", "Chase Credit", "Capital One", "Burlington", "Shell Rewards",
+    "Amex Gold", "Citi Double Cash", "Apple Card", "BoA Debit",
+]
+CATEGORIES = ["Food", "Rent", "Car", "Grocery", "Shopping", "OTT", "Tour", "Job", "Miscellaneous"]
+CATEGORY_WEIGHTS = [0.25, 0.03, 0.1, 0.2, 0.15, 0.05, 0.04, 0.03, 0.15]
+SPENDERS = ["Muttaki", "Sum", "Bismoy"]
+MERCHANTS = 5000
+
+CALCULATIONS = [
+    "calculate_credit_summary", "calculate_totals", "calculate_monthly_expenses",
+    "calculate_monthly_category_expenses", "calculate_monthly_spender_expenses",
+    "calculate_monthly_card_expenses", "calculate_expense_trends", "calculate_daily_expenses",
+    "calculate_budget_usage", "calculate_budget_summary",
+]
+
+
+def generate_ledger(rows, seed=0, start="2022-01-01", days=3 * 365):
+    # Same rows for the same (rows, seed). Amounts are log-normal like the
+    # sample statements: mostly small purchases with a long tail.
+    rng = np.random.default_rng(seed)
+    merchants = np.array([f"Merchant {number:04d}" for number in range(MERCHANTS)], dtype=object)
+    dates = pd.Timestamp(start) + pd.to_timedelta(np.sort(rng.integers(0, days, rows)), unit="D")
+    return pd.DataFrame({
+        "Date": dates,
+        "Source": pd.Categorical.from_codes(rng.integers(0, len(SOURCES), rows), SOURCES),
+        "Description": merchants[rng.zipf(1.3, rows) % MERCHANTS],
+        "Category": pd.Categorical.from_codes(rng.choice(len(CATEGORIES), rows, p=CATEGORY_WEIGHTS), CATEGORIES),
+        "Spender": pd.Categorical.from_codes(rng.integers(0, len(SPENDERS), rows), SPENDERS),
+        "Amount": np.round(rng.lognormal(3.1, 1.1, rows), 2),
+    }, columns=COLUMNS)
+
+
+def parse_size(text):
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1].lower()
+    return int(float(text[:-1]) * multipliers[suffix]) if suffix in multipliers else int(text)
+
+
+def timed(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return {"best": min(seconds), "median": float(np.median(seconds)), "runs": seconds}
+
+
+def _gui():
+    # refresh_table needs a controller; skip it when PyQt5 can't start.
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    return QApplication.instance() or QApplication([])
+
+
+def bench_size(rows, store, repeat, seed, workers=None):
+    from importer import import_statement
+    from model import SpendTrackerModel
+    from storage import CsvSpendStore, ParquetSpendStore, PartitionedSpendStore, SqliteSpendStore
+
+    stores = {"csv": CsvSpendStore, "parquet": ParquetSpendStore, "partitioned": PartitionedSpendStore, "sqlite": SqliteSpendStore}
+    ledger = generate_ledger(rows, seed)
+    results = {}
+
+    model = SpendTrackerModel(stores[store]())
+    if workers is not None:
+        model.parallel.set_workers(workers)
+    model.set_budget_limit("Food", 500.0)
+    results["save_data"] = timed(lambda: model.save_data(ledger), repeat)
+
+    def cold_load():
+        # A fresh model has nothing cached, like an application start.
+        SpendTrackerModel(stores[store]()).load_data()
+
+    results["load_data"] = timed(cold_load, repeat)
+    model.load_data()
+    results["load_data (cached)"] = timed(model.load_data, repeat)
+
+    for name in CALCULATIONS:
+        def cold():
+            model.cube.invalidate()
+            getattr(model, name)()
+
+        results[name] = timed(cold, repeat)
+        results[f"{name} (cached)"] = timed(getattr(model, name), repeat)
+    results["forecast_expenses"] = timed(model.forecast_expenses, repeat)
+
+    app = _gui()
+    if app is not None:
+        from controller import SpendTrackerController
+        from view import SpendTrackerView
+
+        controller = SpendTrackerController(model, SpendTrackerView())
+        results["refresh_table"] = timed(controller.refresh_table, repeat)
+
+    # What upload_data runs on its worker thread, minus the dialogs.
+    statement = os.path.abspath("statement.csv")
+    ledger.to_csv(statement, index=False, date_format="%Y-%m-%d")
+    results["upload_data (replace)"] = timed(lambda: import_statement(model, statement, mode="replace"), repeat)
+    results["upload_data (all duplicates)"] = timed(lambda: import_statement(model, statement, mode="merge"), repeat)
+    model.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Prints best-time ratios against a previous run; returns the regressions.
+    regressions = []
+    if baseline.get("store") != results["store"]:
+        print(f"warning: comparing {results['store']} against a {baseline.get('store')} baseline", file=sys.stderr)
+    for size, operations in results["results"].items():
+        for operation, timing in operations.items():
+            previous = baseline["results"].get(size, {}).get(operation)
+            if not previous:
+                continue
+            ratio = timing["best"] / previous["best"] if previous["best"] else float("inf")
+            flag = "  REGRESSION" if ratio > 1 + threshold else ""
+            print(f"{size:>9} {operation:<48} {previous['best']:9.4f}s -> {timing['best']:9.4f}s  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((size, operation, ratio))
+    return regressions
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the spend tracker on synthetic ledgers.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="ledger sizes, e.g. 10k 100k 1M 10M")
+    parser.add_argument("--store", choices=["csv", "parquet", "partitioned", "sqlite"],
+                        default=os.environ.get("SPENDTRACKER_STORE", "parquet"))
+    parser.add_argument("--workers", type=int, help="aggregation processes (default: $SPENDTRACKER_WORKERS)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": _commit(),
+        "store": args.store,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "seed": args.seed,
+        "results": {},
+    }
+    home = os.getcwd()
+    for size in args.sizes:
+        scratch = tempfile.mkdtemp(prefix="spendtracker-bench-")
+        os.chdir(scratch)
+        try:
+            results["results"][size] = bench_size(parse_size(size), args.store, args.repeat, args.seed, args.workers)
+        finally:
+            os.chdir(home)
+            shutil.rmtree(scratch, ignore_errors=True)
+        for operation, timing in results["results"][size].items():
+            print(f"{size:>9} {operation:<48} {timing['best']:9.4f}s")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            if compare(results, json.load(file), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
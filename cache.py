@@ -0,0 +1,70 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    # LRU cache of query results for one ledger version at a time, bounded by
+    # an estimate of their size in bytes. Versions only go up, so the first
+    # lookup for a newer version drops everything cached for older ones, and
+    # results computed against an older version are not stored.
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _advance(self, version):
+        # Returns False for a version older than the cached one.
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+        return True
+
+    def get(self, query, version, default=None):
+        with self._lock:
+            if self._advance(version) and query in self._entries:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return self._entries[query][0]
+            self.misses += 1
+            return default
+
+    def put(self, query, version, value, size=None):
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if not self._advance(version) or size > self.max_bytes:
+                return
+            if query in self._entries:
+                self.bytes -= self._entries.pop(query)[1]
+            self._entries[query] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self._entries.popitem(last=False)[1][1]
+
+    def get_or_compute(self, query, version, compute):
+        missing = object()
+        value = self.get(query, version, missing)
+        if value is missing:
+            value = compute()
+            self.put(query, version, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self.bytes}
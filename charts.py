@@ -0,0 +1,142 @@
+import pandas as pd
+
+
+def _matplotlib():
+    # Charts only appear on request, so matplotlib's Qt backend is loaded
+    # the first time one is drawn rather than at startup.
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasQTAgg
+
+
+def same_data(a, b):
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (pd.Series, pd.DataFrame)):
+        return a.equals(b) and a.index.equals(b.index)
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(same_data(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+class Chart:
+    # A figure and canvas that stay alive between requests. build(ax, data)
+    # draws from scratch and returns whatever update(artists, data) needs to
+    # change the chart in place; update returns False when it can't (e.g.
+    # the set of bars changed), and the chart is rebuilt instead.
+    def __init__(self, Figure, FigureCanvas):
+        self.figure = Figure(figsize=(6, 4))
+        self.canvas = FigureCanvas(self.figure)
+        # Lets the view detach the canvas instead of deleting it.
+        self.canvas.setProperty("reusable", True)
+        self.axes = None
+        self.artists = None
+        self.data = None
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _animated(self):
+        if self.axes is None:
+            return []
+        return [artist for artist in self.axes.get_children() if artist.get_animated()]
+
+    def _on_draw(self, event):
+        # Full draws leave out animated artists: keep that as the blit
+        # background, then paint them on top.
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for artist in self._animated():
+            self.axes.draw_artist(artist)
+
+    def _limits(self):
+        return self.axes.get_xlim() + self.axes.get_ylim()
+
+    def render(self, data, build, update=None):
+        if self.axes is not None and same_data(data, self.data):
+            # Unchanged: the canvas still holds the last rendered image.
+            return
+        if self.axes is not None and update is not None:
+            limits = self._limits()
+            if update(self.artists, data):
+                self.data = data
+                self.axes.relim()
+                self.axes.autoscale_view()
+                if self.background is not None and self._limits() == limits:
+                    self.canvas.restore_region(self.background)
+                    for artist in self._animated():
+                        self.axes.draw_artist(artist)
+                    self.canvas.blit(self.figure.bbox)
+                else:
+                    self.canvas.draw_idle()
+                return
+
+        self.figure.clear()
+        self.axes = self.figure.add_subplot(111)
+        self.artists = build(self.axes, data)
+        self.data = data
+        self.background = None
+        self.canvas.draw_idle()
+
+
+class ChartManager:
+    # One Chart per chart type, created on first use.
+    def __init__(self):
+        self._charts = {}
+
+    def show(self, key, data, build, update=None):
+        chart = self._charts.get(key)
+        if chart is None:
+            chart = self._charts[key] = Chart(*_matplotlib())
+        chart.render(data, build, update)
+        return chart.canvas
+
+
+def _animate(artists):
+    for artist in artists:
+        artist.set_animated(True)
+    return artists
+
+
+def build_bars(ax, labels, values, **style):
+    labels = [str(label) for label in labels]
+    return labels, _animate(ax.bar(labels, values, **style))
+
+
+def update_bars(artists, labels, values):
+    old_labels, bars = artists
+    if old_labels != [str(label) for label in labels]:
+        return False
+    for bar, value in zip(bars, values):
+        bar.set_height(value)
+    return True
+
+
+def build_stacked_bars(ax, labels, lower, upper, lower_style, upper_style):
+    x = range(len(labels))
+    bottom = _animate(ax.bar(x, lower, 0.4, **lower_style))
+    top = _animate(ax.bar(x, upper, 0.4, bottom=lower, **upper_style))
+    return list(labels), bottom, top
+
+
+def update_stacked_bars(artists, labels, lower, upper):
+    old_labels, bottom, top = artists
+    if old_labels != list(labels):
+        return False
+    for lower_bar, upper_bar, low, high in zip(bottom, top, lower, upper):
+        lower_bar.set_height(low)
+        upper_bar.set_y(low)
+        upper_bar.set_height(high)
+    return True
+
+
+def build_line(ax, labels, values, **style):
+    labels = [str(label) for label in labels]
+    (line,) = ax.plot(labels, values, **style)
+    return labels, _animate([line])[0]
+
+
+def update_line(artists, labels, values):
+    old_labels, line = artists
+    if old_labels != [str(label) for label in labels]:
+        return False
+    line.set_ydata(values)
+    return True
@@ -1,7 +1,21 @@
-from PyQt5.QtWidgets import QTableWidgetItem, QMessageBox, QLabel, QDialog, QVBoxLayout, QFormLayout, QLineEdit, QHBoxLayout, QComboBox, QPushButton
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt5.QtWidgets import (
+    QMessageBox, QLabel, QDialog, QVBoxLayout, QFormLayout, QLineEdit, QHBoxLayout, QComboBox, QPushButton, QCheckBox,
+    QTableView
+)
+from PyQt5.QtCore import QThread
 import pandas as pd
+from cache import ResultCache, estimate_size
+from charts import ChartManager, build_bars, build_line, build_stacked_bars, update_bars, update_line, update_stacked_bars
+from importer import import_statement
+from metrics import instrumented, registry
+from rules import RULE_FIELDS
+from table_model import FrameTableModel, LedgerTableModel
+from workers import TaskRunner
+
+DEFAULT_CATEGORIES = ["Food", "Rent", "Car", "Grocery", "Shopping", "OTT", "Tour", "Job", "Miscellaneous"]
+DEFAULT_SPENDERS = ["Muttaki", "Sum"]
+# Add Expense choice that leaves the category to the categorization rules.
+AUTO_CATEGORY = "Auto (rules)"
 
 
 class SpendTrackerController:
@@ -12,100 +26,205 @@ class SpendTrackerController:
         self.view.tabs.setCurrentIndex(0)
 
         self.view.upload_button.clicked.connect(self.upload_data)
+        self.view.export_button.clicked.connect(self.export_data)
         self.view.add_expense_button.clicked.connect(self.add_expense)
-        self.view.show_summary_button.clicked.connect(self.show_summary_buttons)
+        self.view.show_summary_button.clicked.connect(lambda: self.show_summary_buttons())
         self.view.delete_row_button.clicked.connect(self.delete_row)
         self.view.delete_all_button.clicked.connect(self.delete_all_data)
         self.view.credit_limit_button.clicked.connect(self.manage_credit_limits)
-
-        self.view.summary_button_month_vs_spend.clicked.connect(self.show_month_vs_spend_chart)
-        self.view.summary_button_category_spend.clicked.connect(self.show_category_spend_chart)
-        self.view.summary_button_credit_usage.clicked.connect(self.show_credit_usage_chart)
-        self.view.summary_button_category_table.clicked.connect(self.show_category_table)
-        self.view.summary_button_spender_table.clicked.connect(self.show_spender_table)
-        self.view.summary_button_card_table.clicked.connect(self.show_card_table)
-        self.view.summary_button_trends.clicked.connect(self.show_expense_trends)
-        self.view.summary_button_forecast.clicked.connect(self.show_forecasted_expenses)
-
-        self.view.summary_button_layout.addWidget(self.view.show_summary_button)
-        
-
-        self.view.budget_button_set_limit.clicked.connect(self.set_budget_limit)
-        self.view.budget_button_summary.clicked.connect(self.show_budget_summary)
-
-        self.view.insights_button_top_categories.clicked.connect(self.show_top_categories_chart)
-        self.view.insights_button_top_spenders.clicked.connect(self.show_top_spenders_chart)
-        self.view.insights_button_high_expense_days.clicked.connect(self.show_high_expense_days_table)
-
-
+        self.view.rules_button.clicked.connect(self.manage_rules)
+
+        self.view.tabBuilt.connect(self.connect_tab)
+        for name in list(self.view.built_tabs):
+            self.connect_tab(name)
+
+        self.tasks = TaskRunner(self.view)
+        self.charts = ChartManager()
+        # Table models for cached results; only touched on the GUI thread.
+        self.table_models = ResultCache(max_bytes=16 * 1024 * 1024)
+        self.tasks.busyChanged.connect(self.view.set_busy)
+        self.tasks.progressChanged.connect(self.view.set_progress)
+        self.view.cancel_task_button.clicked.connect(self.tasks.cancel_all)
+        self.view.metrics_shortcut.activated.connect(self.show_metrics)
+
+        self.table_model = LedgerTableModel(self.model, self.tasks)
+        self.table_model.loadFailed.connect(self.show_task_error)
+        self.view.table.setModel(self.table_model)
         self.enable_manual_edit()
-
-        self.refresh_table()
+        self.model.alerts.subscribe(self.show_alerts)
+
+        # Filters from the filter bar, as query_row_ids() keyword arguments.
+        # The grid and the summary and insight views follow them; credit,
+        # budget and forecast views always cover the whole ledger.
+        self.filters = {}
+        for combo in [self.view.filter_period, self.view.filter_category, self.view.filter_spender, self.view.filter_source]:
+            combo.currentIndexChanged.connect(lambda: self.apply_filters())
+        self.view.search_timer.timeout.connect(lambda: self.apply_filters())
+        self.view.filter_clear_button.clicked.connect(self.view.clear_filters)
+        self.model.subscribe(self.on_ledger_changed)
+        self.refresh_filter_choices()
+
+    def connect_tab(self, name):
+        # Tabs are built on first use; wire their buttons once they exist.
+        # The show_* handlers are instrumented wrappers, so the lambdas drop
+        # clicked's checked argument for them.
+        if name == "summary":
+            self.view.summary_button_month_vs_spend.clicked.connect(lambda: self.show_month_vs_spend_chart())
+            self.view.summary_button_category_spend.clicked.connect(lambda: self.show_category_spend_chart())
+            self.view.summary_button_credit_usage.clicked.connect(lambda: self.show_credit_usage_chart())
+            self.view.summary_button_category_table.clicked.connect(lambda: self.show_category_table())
+            self.view.summary_button_spender_table.clicked.connect(lambda: self.show_spender_table())
+            self.view.summary_button_card_table.clicked.connect(lambda: self.show_card_table())
+            self.view.summary_button_trends.clicked.connect(lambda: self.show_expense_trends())
+            self.view.summary_button_forecast.clicked.connect(lambda: self.show_forecasted_expenses())
+
+            self.view.summary_button_layout.addWidget(self.view.show_summary_button)
+        elif name == "insights":
+            self.view.insights_button_top_categories.clicked.connect(lambda: self.show_top_categories_chart())
+            self.view.insights_button_top_spenders.clicked.connect(lambda: self.show_top_spenders_chart())
+            self.view.insights_button_high_expense_days.clicked.connect(lambda: self.show_high_expense_days_table())
+        elif name == "budget":
+            self.view.budget_button_set_limit.clicked.connect(self.set_budget_limit)
+            self.view.budget_button_summary.clicked.connect(lambda: self.show_budget_summary())
 
     def refresh_table(self):
-        data = self.model.load_data()
-        self.view.table.setRowCount(len(data))
-        for i, row in data.iterrows():
-            for j, value in enumerate(row):
-                if isinstance(value, float):
-                    self.view.table.setItem(i, j, QTableWidgetItem(f"{value:.2f}"))
-                else:
-                    self.view.table.setItem(i, j, QTableWidgetItem(str(value)))
+        self.table_model.reload()
+
+    def on_ledger_changed(self, event, before, after):
+        # A reset can also come from a worker noticing the store changed on
+        # disk; the next change on the GUI thread picks that up.
+        if QThread.currentThread() is self.view.thread():
+            self.refresh_filter_choices()
+
+    def close(self):
+        # On quit, before model.close(): that can compact the ledger, which
+        # the views don't need to follow, and no task should still be
+        # reading the store once it is closed.
+        self.model.unsubscribe(self.on_ledger_changed)
+        self.table_model.detach()
+        self.tasks.shutdown()
+
+    def refresh_filter_choices(self):
+        self.tasks.submit(
+            "filter_choices",
+            self.model.filter_values,
+            lambda values: self.view.set_filter_choices(values["Category"], values["Spender"], values["Source"]),
+            self.show_task_error
+        )
+
+    @instrumented("controller.apply_filters")
+    def apply_filters(self):
+        days, category, spender, source, text = self.view.filter_selection()
+        filters = {"category": category, "spender": spender, "source": source, "text": text}
+        if days is not None:
+            filters["start"] = pd.Timestamp.today().normalize() - pd.Timedelta(days=days - 1)
+        self.filters = {key: value for key, value in filters.items() if value is not None}
+        self.table_model.set_filters(self.filters)
+
+    def filtered_query(self, name, filters):
+        # Cache key for a view's result under the given filters.
+        return (name,) + tuple(sorted(filters.items())) if filters else name
 
     def enable_manual_edit(self):
         self.view.table.setEditTriggers(self.view.table.AllEditTriggers)
-        self.view.table.itemChanged.connect(self.save_manual_changes)
+        self.table_model.editFailed.connect(self.show_edit_error)
+
+    def show_edit_error(self, message):
+        QMessageBox.warning(self.view, "Error", message)
+
+    def show_task_error(self, error):
+        QMessageBox.warning(self.view, "Error", str(error))
+
+    def show_alerts(self, alerts):
+        messages = []
+        for alert in alerts:
+            total, limit = alert["total"], alert["limit"]
+            if alert["kind"] == "budget":
+                month, category = alert["key"]
+                messages.append(f"{category} spending for {month} is {total:.2f}, over its budget of {limit:.2f}.")
+            elif alert["kind"] == "credit":
+                messages.append(f"{alert['key']} usage is {total:.2f}, over its credit limit of {limit:.2f}.")
+            else:
+                messages.append(f"Spending for {alert['key']} is {total:.2f}, over the monthly budget of {limit:.2f}.")
+        self.view.show_alerts(messages)
+
+    def upload_data(self):
+        file_path = self.view.open_file_dialog()
+        if file_path:
+            if not file_path.endswith((".csv", ".xlsx")):
+                QMessageBox.warning(self.view, "Error", "Unsupported file type!")
+                return
+            mode = self.view.ask_import_mode()
+            if mode is None:
+                return
+            self.tasks.submit(
+                "upload",
+                lambda task: import_statement(
+                    self.model, file_path, mode, task=task,
+                    dispatch=lambda fn, *args: self.tasks.call_in_gui_thread(fn, *args, task=task)
+                ),
+                self.finish_upload,
+                lambda e: QMessageBox.warning(self.view, "Error", f"Failed to load data: {e}"),
+                pass_task=True,
+                on_cancelled=lambda result: self.upload_cancelled(mode, result)
+            )
 
-    def save_manual_changes(self, item):
-        row, col = item.row(), item.column()
-        value = item.text()
-        data = self.model.load_data()
+    def upload_cancelled(self, mode, result):
+        if mode == "replace":
+            message = "Import cancelled. The ledger was not changed."
+        else:
+            imported = result["imported"] if result else 0
+            message = f"Import cancelled. {imported} rows had already been added." if imported else (
+                "Import cancelled. No rows were added."
+            )
+        QMessageBox.information(self.view, "Import", message)
 
+    def finish_upload(self, result):
+        if result["error"] is not None:
+            QMessageBox.warning(
+                self.view, "Error",
+                f"Failed to load data: {result['error']}. {result['imported']} rows had already been added."
+            )
         try:
-            if col < len(self.model.columns):
-                if data.dtypes.iloc[col] == "float64":
-                    data.iat[row, col] = float(value) 
-                elif data.dtypes.iloc[col] == "int64":
-                    data.iat[row, col] = int(value)
-                else:
-                    data.iat[row, col] = value 
-            self.model.save_data(data)
-        except ValueError as e:
-            QMessageBox.warning(self.view, "Error", f"Invalid input: {e}")
-            self.refresh_table()
+            for source in result["sources"]:
+                if source.lower() != "cash" and "debit" not in source.lower():
+                    if source not in self.model.credit_limits:
+                        limit, ok = self.view.ask_for_card_limit(source)
+                        if ok:
+                            self.model.add_credit_limit(source, float(limit))  # Cast to float
+        except Exception as e:
+            QMessageBox.warning(self.view, "Error", f"Failed to load data: {e}")
+
+        if result["rejected"]:
+            QMessageBox.information(
+                self.view, "Import",
+                f"Imported {result['imported']} rows. "
+                f"Skipped {result['rejected']} rows with an invalid date or amount."
+            )
 
-    def upload_data(self):
-        file_path = self.view.open_file_dialog()
+        duplicates = result["duplicates"]
+        if duplicates is not None and self.view.ask_import_duplicates(len(duplicates)):
+            self.model.append_expenses(duplicates)
+
+    def export_data(self):
+        file_path = self.view.save_file_dialog()
         if file_path:
             try:
-                if file_path.endswith(".csv"):
-                    data = pd.read_csv(file_path)
-                elif file_path.endswith(".xlsx"):
-                    data = pd.read_excel(file_path)
-                else:
-                    QMessageBox.warning(self.view, "Error", "Unsupported file type!")
-                    return
-
-                self.model.save_data(data)
-
-                unique_sources = data["Source"].unique()
-                for source in unique_sources:
-                    if source.lower() != "cash" and "debit" not in source.lower():
-                        if source not in self.model.credit_limits:
-                            limit, ok = self.view.ask_for_card_limit(source)
-                            if ok:
-                                self.model.add_credit_limit(source, float(limit))  # Cast to float
-
-                self.refresh_table()
+                self.model.export_csv(file_path)
             except Exception as e:
-                QMessageBox.warning(self.view, "Error", f"Failed to load data: {e}")
+                QMessageBox.warning(self.view, "Error", f"Failed to export data: {e}")
 
+    def known_values(self, column, defaults):
+        # The defaults, then whatever else the ledger or the rules use.
+        key = column.lower()
+        values = self.model.filter_values()[column] + [rule[key] for rule in self.model.rules.rules if rule.get(key)]
+        return list(dict.fromkeys(defaults + sorted(values)))
 
     def add_expense(self):
         dialog = self.view.open_add_expense_dialog(
             sources=list(self.model.credit_limits.keys()),
-            categories=["Food", "Rent", "Car", "Grocery", "Shopping", "OTT", "Tour", "Job", "Miscellaneous"],
-            spenders=["Muttaki", "Sum"]
+            categories=[AUTO_CATEGORY] + self.known_values("Category", DEFAULT_CATEGORIES),
+            spenders=self.known_values("Spender", DEFAULT_SPENDERS)
         )
         if dialog.exec_():
             date = f"{dialog.year_input.currentText()}-{dialog.month_input.currentText()}-{dialog.day_input.currentText()}"
@@ -117,20 +236,18 @@ class SpendTrackerController:
                 "Spender": dialog.spender_input.currentText(),
                 "Amount": float(dialog.amount_input.text())
             }
-            data = self.model.load_data()
-            data = pd.concat([data, pd.DataFrame([new_row])], ignore_index=True)
-            self.model.save_data(data)
-
-            self.refresh_table()
+            if new_row["Category"] == AUTO_CATEGORY:
+                new_row["Category"] = ""
+                new_row = self.model.categorize(pd.DataFrame([new_row])).iloc[0].to_dict()
+                new_row["Category"] = new_row["Category"] or "Miscellaneous"
+            self.model.append_expenses([new_row])
 
     def delete_row(self):
 
-        selected_row = self.view.table.currentRow()
+        selected_row = self.view.table.currentIndex().row()
         if selected_row >= 0:
-            data = self.model.load_data()
-            data = data.drop(index=selected_row).reset_index(drop=True)
-            self.model.save_data(data)
-            self.refresh_table()
+            self.model.delete_rows([self.table_model.row_id(selected_row)])
+            self.model.maybe_compact()
 
     def delete_all_data(self):
         confirmation = QMessageBox.question(
@@ -139,7 +256,6 @@ class SpendTrackerController:
         )
         if confirmation == QMessageBox.Yes:
             self.model.clear_data()
-            self.refresh_table()
 
     def manage_credit_limits(self):
         dialog = QDialog(self.view)
@@ -199,28 +315,111 @@ class SpendTrackerController:
             self.model.delete_credit_card(card_name)
             QMessageBox.information(dialog, "Success", f"Card '{card_name}' deleted successfully.")
 
-    def enable_manual_edit(self):
-        self.view.table.setEditTriggers(self.view.table.AllEditTriggers)
-        self.view.table.itemChanged.connect(self.save_manual_changes)
+    def manage_rules(self):
+        dialog = QDialog(self.view)
+        dialog.setWindowTitle("Categorization Rules")
+        layout = QVBoxLayout(dialog)
 
-    def save_manual_changes(self, item):
-        row, col = item.row(), item.column()
-        value = item.text()
-        data = self.model.load_data()
+        form_layout = QFormLayout()
+        pattern_input = QLineEdit()
+        pattern_input.setPlaceholderText("Text to look for, e.g. starbucks")
+        field_input = QComboBox()
+        field_input.addItems(RULE_FIELDS)
+        category_input = QComboBox()
+        category_input.setEditable(True)
+        category_input.addItems([""] + self.known_values("Category", DEFAULT_CATEGORIES))
+        spender_input = QComboBox()
+        spender_input.setEditable(True)
+        spender_input.addItems([""] + self.known_values("Spender", DEFAULT_SPENDERS))
+        regex_input = QCheckBox("Pattern is a regular expression")
+        override_input = QCheckBox("Replace the category/spender a statement already has")
+
+        form_layout.addRow("Pattern:", pattern_input)
+        form_layout.addRow("Look in:", field_input)
+        form_layout.addRow("Set Category:", category_input)
+        form_layout.addRow("Set Spender:", spender_input)
+        form_layout.addRow(regex_input)
+        form_layout.addRow(override_input)
+
+        button_layout = QHBoxLayout()
+        add_button = QPushButton("Add/Update Rule")
+        delete_button = QPushButton("Delete Selected Rule")
+        button_layout.addWidget(add_button)
+        button_layout.addWidget(delete_button)
+
+        rules_table = QTableView()
+        rules_table.setMinimumWidth(700)
+        rules_table.setModel(self.rules_table_model())
+
+        layout.addLayout(form_layout)
+        layout.addLayout(button_layout)
+        layout.addWidget(QLabel("Rules, first match wins (applied to imports and to Auto expenses):"))
+        layout.addWidget(rules_table)
+
+        add_button.clicked.connect(lambda: self.add_rule(
+            pattern_input.text(), field_input.currentText(), category_input.currentText().strip(),
+            spender_input.currentText().strip(), regex_input.isChecked(), override_input.isChecked(), rules_table, dialog
+        ))
+        delete_button.clicked.connect(lambda: self.delete_rule(rules_table, dialog))
+
+        dialog.setLayout(layout)
+        dialog.exec_()
 
+    def rules_table_model(self):
+        rules = self.model.rules.frame()
+        rules.index = range(1, len(rules) + 1)
+        return FrameTableModel(rules.astype(object).where(rules.notna(), ""))
+
+    def add_rule(self, pattern, field, category, spender, regex, override, rules_table, dialog):
         try:
-            if col < len(self.model.columns):
-                if data.dtypes.iloc[col] == "float64":
-                    data.iat[row, col] = float(value)
-                elif data.dtypes.iloc[col] == "int64":
-                    data.iat[row, col] = int(value)
-                else:
-                    data.iat[row, col] = value
-            self.model.save_data(data)
+            self.model.add_rule(pattern, category, spender, field, regex, override)
         except ValueError as e:
-            QMessageBox.warning(self.view, "Error", f"Invalid input: {e}")
-            self.refresh_table()
+            QMessageBox.warning(dialog, "Error", str(e))
+            return
+        rules_table.setModel(self.rules_table_model())
+
+    def delete_rule(self, rules_table, dialog):
+        row = rules_table.currentIndex().row()
+        if row < 0:
+            QMessageBox.warning(dialog, "Error", "Select a rule to delete.")
+            return
+        self.model.delete_rule(row)
+        rules_table.setModel(self.rules_table_model())
+
+    def show_metrics(self):
+        summary = pd.DataFrame.from_dict(registry.summary(), orient="index")
+        if not summary.empty:
+            for column in ["total", "p50", "p95", "max"]:
+                summary[column] = (summary[column] * 1000).round(2)
+            summary = summary.rename(columns={"total": "total ms", "p50": "p50 ms", "p95": "p95 ms", "max": "max ms"})
+        results, tables = self.model.results.stats(), self.table_models.stats()
+        notes = (
+            f"Result cache: {results['hits']} hits, {results['misses']} misses, "
+            f"{results['entries']} entries, {results['bytes'] / 1e6:.1f} MB. "
+            f"Table models: {tables['entries']} entries, {tables['bytes'] / 1e6:.1f} MB."
+        )
+        self.view.show_metrics(FrameTableModel(summary), notes)
+
+    def show_cached(self, task_key, query, compute, draw):
+        # Results are cached per ledger version; on a hit the worker is
+        # skipped entirely. draw receives (version, result).
+        version = self.model.current_version()
+        missing = object()
+        result = self.model.results.get(query, version, missing)
+        if result is not missing:
+            self.tasks.cancel(task_key)
+            draw(version, result)
+            return
+        self.tasks.submit(task_key, lambda: self.model.cached(query, compute), lambda done: draw(*done), self.show_task_error)
 
+    def table_model_for(self, query, version, frame):
+        table_model = self.table_models.get(query, version)
+        if table_model is None:
+            table_model = FrameTableModel(frame)
+            self.table_models.put(query, version, table_model, size=estimate_size(frame))
+        return table_model
+
+    @instrumented("controller.show_summary_buttons")
     def show_summary_buttons(self):
         self.view.clear_summary_scroll()
         self.view.summary_scroll.setMinimumHeight(400)  # Allows resizing manually
@@ -228,180 +427,278 @@ class SpendTrackerController:
         label = QLabel("Click a button to view specific charts or tables.")
         self.view.summary_scroll_layout.addWidget(label)
 
+    @instrumented("controller.show_month_vs_spend_chart")
     def show_month_vs_spend_chart(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        month_expense = data.groupby(data["Date"].dt.to_period("M"))["Amount"].sum()
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-        ax.bar(month_expense.index.astype(str), month_expense.values, color="skyblue")
-        ax.set_title("Month vs Spend")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Expense")
-        canvas = FigureCanvas(fig)
+        filters = self.filters
+        self.tasks.submit(
+            "summary", lambda: self.model.calculate_monthly_expenses(filters), self.draw_month_vs_spend_chart,
+            self.show_task_error
+        )
 
+    def draw_month_vs_spend_chart(self, month_expense):
+        def build(ax, data):
+            artists = build_bars(ax, data.index, data.values, color="skyblue")
+            ax.set_title("Month vs Spend")
+            ax.set_xlabel("Month")
+            ax.set_ylabel("Expense")
+            return artists
+
+        canvas = self.charts.show(
+            "month_vs_spend", month_expense, build,
+            lambda artists, data: update_bars(artists, data.index, data.values)
+        )
         self.view.clear_summary_scroll()
         self.view.add_chart_to_summary("Month vs Spend", canvas)
 
+    @instrumented("controller.show_category_spend_chart")
     def show_category_spend_chart(self):
-        data = self.model.load_data()
-        category_expense = data.groupby("Category")["Amount"].sum()
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-        ax.pie(
-            category_expense.values,
-            labels=category_expense.index,
-            autopct='%1.1f%%',
-            startangle=140,
-            textprops={'fontsize': 8} 
+        filters = self.filters
+        self.tasks.submit(
+            "summary",
+            lambda: pd.Series(self.model.calculate_totals(filters)[2], dtype=float),
+            self.draw_category_spend_chart,
+            self.show_task_error
         )
-        ax.set_title("Category-wise Spend", fontsize=16) 
-        canvas = FigureCanvas(fig)
 
+    def draw_category_spend_chart(self, category_expense):
+        def build(ax, data):
+            ax.pie(
+                data.values,
+                labels=data.index,
+                autopct='%1.1f%%',
+                startangle=140,
+                textprops={'fontsize': 8} 
+            )
+            ax.set_title("Category-wise Spend", fontsize=16) 
+
+        canvas = self.charts.show("category_spend", category_expense, build)
         self.view.clear_summary_scroll()
         self.view.add_chart_to_summary("Category-wise Spend", canvas)
 
+    @instrumented("controller.show_credit_usage_chart")
     def show_credit_usage_chart(self):
-        credit_summary = self.model.calculate_credit_summary()
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-
-        cards = list(credit_summary.keys())
-        used = [credit_summary[card]["Used"] for card in cards]
-        remaining = [credit_summary[card]["Remaining"] for card in cards]
-
-        bar_width = 0.4
-        x = range(len(cards))
-        ax.bar(x, used, bar_width, label="Used Credit", color="tomato")
-        ax.bar(x, remaining, bar_width, bottom=used, label="Available Credit", color="lightgreen")
-        ax.set_xticks(x)
-        ax.set_xticklabels(cards, rotation=45)
-        ax.set_title("Credit Card Usage")
-        ax.legend()
-        canvas = FigureCanvas(fig)
-
+        self.tasks.submit("summary", self.model.calculate_credit_summary, self.draw_credit_usage_chart, self.show_task_error)
+
+    def draw_credit_usage_chart(self, credit_summary):
+        def columns(data):
+            cards = list(data.keys())
+            return cards, [data[card]["Used"] for card in cards], [data[card]["Remaining"] for card in cards]
+
+        def build(ax, data):
+            cards, used, remaining = columns(data)
+            artists = build_stacked_bars(
+                ax, cards, used, remaining,
+                {"label": "Used Credit", "color": "tomato"},
+                {"label": "Available Credit", "color": "lightgreen"}
+            )
+            ax.set_xticks(range(len(cards)))
+            ax.set_xticklabels(cards, rotation=45)
+            ax.set_title("Credit Card Usage")
+            ax.legend()
+            return artists
+
+        canvas = self.charts.show(
+            "credit_usage", credit_summary, build,
+            lambda artists, data: update_stacked_bars(artists, *columns(data))
+        )
         self.view.clear_summary_scroll()
         self.view.add_chart_to_summary("Credit Card Usage", canvas)
 
+    @instrumented("controller.show_category_table")
     def show_category_table(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        category_table = data.groupby(["Category", data["Date"].dt.to_period("M")])["Amount"].sum().unstack(fill_value=0)
-        category_table = category_table.astype(float).round(2)
+        filters = self.filters
+        query = self.filtered_query("monthly_category_table", filters)
+        self.show_cached(
+            "summary",
+            query,
+            lambda: self.model.calculate_monthly_category_expenses(filters).T.astype(float).round(2),
+            lambda version, table: self.draw_category_table(self.table_model_for(query, version, table))
+        )
+
+    def draw_category_table(self, category_table):
         self.view.clear_summary_scroll()
         self.view.add_table_to_summary("Category-wise Expense by Month", category_table)
 
+    @instrumented("controller.show_spender_table")
     def show_spender_table(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        spender_table = data.groupby(["Spender", data["Date"].dt.to_period("M")])["Amount"].sum().unstack(fill_value=0)
-        spender_table = spender_table.astype(float).round(2)
+        filters = self.filters
+        query = self.filtered_query("monthly_spender_table", filters)
+        self.show_cached(
+            "summary",
+            query,
+            lambda: self.model.calculate_monthly_spender_expenses(filters).T.astype(float).round(2),
+            lambda version, table: self.draw_spender_table(self.table_model_for(query, version, table))
+        )
+
+    def draw_spender_table(self, spender_table):
         self.view.clear_summary_scroll()
         self.view.add_table_to_summary("Spender-wise Expense by Month", spender_table)
 
+    @instrumented("controller.show_card_table")
     def show_card_table(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        card_table = data.groupby(["Source", data["Date"].dt.to_period("M")])["Amount"].sum().unstack(fill_value=0)
-        card_table = card_table.astype(float).round(2)
+        filters = self.filters
+        query = self.filtered_query("monthly_card_table", filters)
+        self.show_cached(
+            "summary",
+            query,
+            lambda: self.model.calculate_monthly_card_expenses(filters).T.astype(float).round(2),
+            lambda version, table: self.draw_card_table(self.table_model_for(query, version, table))
+        )
+
+    def draw_card_table(self, card_table):
         self.view.clear_summary_scroll()
         self.view.add_table_to_summary("Card-wise Expense by Month", card_table)
 
-
+    @instrumented("controller.show_expense_trends")
     def show_expense_trends(self):
-        trends = self.model.calculate_expense_trends()
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-        ax.plot(trends.index.astype(str), trends.values, marker="o", linestyle="-", color="blue")
-        ax.set_title("Monthly Expense Trends")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Total Expense")
-        ax.grid(True)
+        filters = self.filters
+        self.tasks.submit(
+            "summary", lambda: self.model.calculate_expense_trends(filters), self.draw_expense_trends, self.show_task_error
+        )
 
-        canvas = FigureCanvas(fig)
+    def draw_expense_trends(self, trends):
+        def build(ax, data):
+            artists = build_line(ax, data.index, data.values, marker="o", linestyle="-", color="blue")
+            ax.set_title("Monthly Expense Trends")
+            ax.set_xlabel("Month")
+            ax.set_ylabel("Total Expense")
+            ax.grid(True)
+            return artists
+
+        canvas = self.charts.show(
+            "expense_trends", trends, build,
+            lambda artists, data: update_line(artists, data.index, data.values)
+        )
         self.view.clear_summary_scroll()
         self.view.add_chart_to_summary("Expense Trends", canvas)
 
+    @instrumented("controller.show_forecasted_expenses")
     def show_forecasted_expenses(self):
-        trends = self.model.calculate_expense_trends()
-        forecast = self.model.forecast_expenses(months_ahead=3)
+        self.show_cached(
+            "summary",
+            "forecast",
+            lambda: (
+                self.model.calculate_expense_trends(),
+                self.model.forecast_expenses(months_ahead=3),
+                self.model.forecast_series("Category", months_ahead=3, method="auto"),
+            ),
+            self.draw_forecasted_expenses
+        )
+
+    def draw_forecasted_expenses(self, version, result):
+        trends, forecast, by_category = result
 
         if not forecast:
             QMessageBox.warning(self.view, "Insufficient Data", "Not enough data to forecast expenses.")
             return
 
-        forecast_months = list(forecast.keys())
-        forecast_values = list(forecast.values())
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-
-        ax.plot(trends.index.astype(str), trends.values, marker="o", linestyle="-", label="Historical", color="blue")
-        ax.plot(forecast_months, forecast_values, marker="x", linestyle="--", label="Forecasted", color="orange")
-
-        ax.set_title("Expense Trends & Forecasting")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Expense")
-        ax.legend()
-        ax.grid(True)
+        def lines(data):
+            # (labels, values, style) for the total and for each category.
+            trends, forecast, (history, predicted) = data
+            yield trends.index, trends.values, {"marker": "o", "linestyle": "-", "label": "Historical", "color": "blue"}
+            yield list(forecast), list(forecast.values()), {"marker": "x", "linestyle": "--", "label": "Forecasted", "color": "orange"}
+            for number, category in enumerate(predicted.columns):
+                color = f"C{number % 10}"
+                yield history.index, history[category].values, {"linewidth": 0.8, "alpha": 0.5, "color": color}
+                yield predicted.index, predicted[category].values, {"linewidth": 0.8, "linestyle": "--", "label": category, "color": color}
+
+        def build(ax, data):
+            artists = [build_line(ax, labels, values, **style) for labels, values, style in lines(data)]
+            ax.set_title("Expense Trends & Forecasting")
+            ax.set_xlabel("Month")
+            ax.set_ylabel("Expense")
+            ax.legend(fontsize="x-small", ncol=2)
+            ax.grid(True)
+            return artists
+
+        def update(artists, data):
+            new_lines = list(lines(data))
+            return len(new_lines) == len(artists) and all(
+                update_line(artist, labels, values) for artist, (labels, values, style) in zip(artists, new_lines)
+            )
 
-        canvas = FigureCanvas(fig)
+        canvas = self.charts.show("forecast", result, build, update)
         self.view.clear_summary_scroll()
         self.view.add_chart_to_summary("Expense Forecasting", canvas)
 
+        predicted = by_category[1].T.round(2)
+        predicted.columns = predicted.columns.astype(str)
+        self.view.add_table_to_summary("Forecast by Category", self.table_model_for("forecast_by_category", version, predicted))
+
+    @instrumented("controller.show_top_categories_chart")
     def show_top_categories_chart(self):
-        data = self.model.load_data()
-        category_expense = data.groupby("Category")["Amount"].sum().sort_values(ascending=False).head(5)
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-        ax.bar(category_expense.index, category_expense.values, color="coral")
-        ax.set_title("Top Spending Categories")
-        ax.set_xlabel("Category")
-        ax.set_ylabel("Total Expense")
-        ax.tick_params(axis='x', rotation=45)
-        canvas = FigureCanvas(fig)
+        filters = self.filters
+        self.show_cached(
+            "insights",
+            self.filtered_query("top_categories", filters),
+            lambda: pd.Series(self.model.calculate_totals(filters)[2], dtype=float).sort_values(ascending=False).head(5),
+            lambda version, category_expense: self.draw_top_categories_chart(category_expense)
+        )
 
+    def draw_top_categories_chart(self, category_expense):
+        def build(ax, data):
+            artists = build_bars(ax, data.index, data.values, color="coral")
+            ax.set_title("Top Spending Categories")
+            ax.set_xlabel("Category")
+            ax.set_ylabel("Total Expense")
+            ax.tick_params(axis='x', rotation=45)
+            return artists
+
+        canvas = self.charts.show(
+            "top_categories", category_expense, build,
+            lambda artists, data: update_bars(artists, data.index, data.values)
+        )
         self.view.clear_insights_scroll()
         self.view.add_chart_to_insights("Top Spending Categories", canvas)
 
+    @instrumented("controller.show_top_spenders_chart")
     def show_top_spenders_chart(self):
-        data = self.model.load_data()
-        spender_expense = data.groupby("Spender")["Amount"].sum()
-
-        fig = Figure(figsize=(6, 4))
-        ax = fig.add_subplot(111)
-        ax.pie(
-            spender_expense.values,
-            labels=spender_expense.index,
-            autopct='%1.1f%%',
-            startangle=140,
-            textprops={'fontsize': 8}
+        filters = self.filters
+        self.tasks.submit(
+            "insights",
+            lambda: pd.Series(self.model.calculate_totals(filters)[1], dtype=float),
+            self.draw_top_spenders_chart,
+            self.show_task_error
         )
-        ax.set_title("Top Spenders")
-        canvas = FigureCanvas(fig)
 
+    def draw_top_spenders_chart(self, spender_expense):
+        def build(ax, data):
+            ax.pie(
+                data.values,
+                labels=data.index,
+                autopct='%1.1f%%',
+                startangle=140,
+                textprops={'fontsize': 8}
+            )
+            ax.set_title("Top Spenders")
+
+        canvas = self.charts.show("top_spenders", spender_expense, build)
         self.view.clear_insights_scroll()
         self.view.add_chart_to_insights("Top Spenders", canvas)
 
+    @instrumented("controller.show_high_expense_days_table")
     def show_high_expense_days_table(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        high_expense_days = data.groupby("Date")["Amount"].sum().sort_values(ascending=False).head(5).reset_index()
-
-        high_expense_days.rename(columns={"Date": "Date", "Total Expense": "Amount"}, inplace=True)
-        high_expense_days["Date"] = high_expense_days["Date"].dt.strftime("%Y-%m-%d")
+        filters = self.filters
+        query = self.filtered_query("high_expense_days", filters)
+
+        def compute():
+            days = self.model.calculate_daily_expenses(filters).sort_values(ascending=False).head(5).reset_index()
+            days["Date"] = days["Date"].dt.strftime("%Y-%m-%d")
+            return days
+
+        self.show_cached(
+            "insights",
+            query,
+            compute,
+            lambda version, days: self.draw_high_expense_days_table(self.table_model_for(query, version, days))
+        )
 
+    def draw_high_expense_days_table(self, high_expense_days):
         self.view.clear_insights_scroll()
         self.view.add_table_to_insights("High-Expense Days", high_expense_days)
 
     def set_budget_limit(self):
-        data = self.model.load_data()
-        categories = data["Category"].unique().tolist()
+        categories = list(self.model.calculate_totals()[2])
 
         dialog = self.view.open_budget_limit_dialog(categories)
         if dialog.exec_():
@@ -412,13 +709,16 @@ class SpendTrackerController:
             except ValueError:
                 QMessageBox.warning(self.view, "Error", "Please enter a valid numeric limit.")
 
+    @instrumented("controller.show_budget_summary")
     def show_budget_summary(self):
-        data = self.model.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        latest_month = data["Date"].dt.to_period("M").max()
-        latest_month_data = data[data["Date"].dt.to_period("M") == latest_month]
-        budget_summary = self.model.calculate_budget_summary(latest_month_data)
+        self.tasks.submit(
+            "budget",
+            lambda: self.model.calculate_budget_summary(self.model.latest_month()),
+            self.draw_budget_summary,
+            self.show_task_error
+        )
 
+    def draw_budget_summary(self, budget_summary):
         self.view.clear_budget_scroll()
         self.view.add_budget_summary(budget_summary)
 
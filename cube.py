@@ -0,0 +1,73 @@
+import pandas as pd
+
+from storage import to_cents
+
+
+CUBE_KEYS = ["Month", "Category", "Spender", "Source"]
+
+
+def _cell_key(key):
+    # Missing values (NaN, NaT) all become None, so a row with a blank
+    # Category lands in the same cell every time: NaN never equals itself.
+    return tuple(None if pd.isna(value) else value for value in key)
+
+
+class AggregateCube:
+    # Sum and row count of Amount per (Month, Category, Spender, Source),
+    # kept in step with the ledger through model mutation events. Sums are
+    # held in cents, so incremental updates never drift. Rows with a missing
+    # key are kept under None, so whole-ledger and monthly totals count every
+    # row; slices by a key leave them out, as groupby does.
+    def __init__(self):
+        self._cells = None
+        self._frame = None
+
+    def is_built(self):
+        return self._cells is not None
+
+    def invalidate(self):
+        self._cells = None
+        self._frame = None
+
+    def build(self, totals):
+        self._cells = {
+            _cell_key(key): [cents, count]
+            for key, cents, count in zip(totals.index, to_cents(totals["Amount"]), totals["Count"])
+        }
+        self._frame = None
+
+    def _apply(self, rows, sign):
+        if rows is None or rows.empty:
+            return
+        rows = rows.assign(Month=rows["Date"].dt.to_period("M"), Amount=to_cents(rows["Amount"]))
+        delta = rows.groupby(CUBE_KEYS, observed=True, dropna=False)["Amount"].agg(["sum", "count"])
+        for key, cents, count in zip(delta.index, delta["sum"], delta["count"]):
+            key = _cell_key(key)
+            cell = self._cells.setdefault(key, [0, 0])
+            cell[0] += sign * int(cents)
+            cell[1] += sign * count
+            if cell[1] <= 0:
+                del self._cells[key]
+        self._frame = None
+
+    def on_ledger_changed(self, event, before, after):
+        if event == "reset":
+            self.invalidate()
+        elif self.is_built():
+            self._apply(before, -1)
+            self._apply(after, 1)
+
+    def frame(self):
+        if self._frame is None:
+            index = pd.MultiIndex.from_tuples(list(self._cells), names=CUBE_KEYS)
+            cents = [cell[0] for cell in self._cells.values()]
+            self._frame = pd.Series(cents, index=index, dtype="int64", name="Amount").sort_index()
+        return self._frame
+
+    def slice(self, keys, month=None):
+        cube = self.frame()
+        if month is not None:
+            cube = cube[cube.index.get_level_values("Month") == month]
+        if not keys:
+            return cube.sum() / 100
+        return cube.groupby(level=keys).sum() / 100
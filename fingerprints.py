@@ -0,0 +1,92 @@
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+FINGERPRINT_COLUMNS = ["Date", "Source", "Description", "Amount"]
+
+
+def _text(values):
+    # Stripped strings with missing values as "". A categorical column is
+    # cleaned once per category rather than once per row.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.astype(str).str.strip().to_numpy(dtype=object)
+        return pd.Series(np.append(categories, "")[values.cat.codes.to_numpy()], index=values.index)
+    return values.fillna("").astype(str).str.strip()
+
+
+def fingerprint(rows):
+    # One 64-bit content hash per row over Date, Source, Description and
+    # Amount (in cents, so 12.5 and 12.50 match).
+    keys = pd.DataFrame({
+        "Date": rows["Date"].dt.normalize(),
+        "Source": _text(rows["Source"]),
+        "Description": _text(rows["Description"]),
+        "Amount": (rows["Amount"] * 100).round().astype("int64"),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class FingerprintIndex:
+    # Number of ledger rows per content fingerprint, kept in step with the
+    # ledger through model mutation events and saved between sessions.
+    def __init__(self):
+        self._counts = None
+
+    def is_built(self):
+        return self._counts is not None
+
+    def invalidate(self):
+        self._counts = None
+
+    def build(self, rows):
+        self._counts = {}
+        self._apply(rows, 1)
+
+    def _apply(self, rows, sign):
+        if rows is None or rows.empty:
+            return
+        for key in fingerprint(rows).tolist():
+            count = self._counts.get(key, 0) + sign
+            if count > 0:
+                self._counts[key] = count
+            else:
+                self._counts.pop(key, None)
+
+    def on_ledger_changed(self, event, before, after):
+        if event == "reset":
+            self.invalidate()
+        elif self.is_built():
+            self._apply(before, -1)
+            self._apply(after, 1)
+
+    def counts(self, keys):
+        return [self._counts.get(key, 0) for key in keys]
+
+    def save(self, path, token):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            np.savez(
+                file,
+                keys=np.fromiter(self._counts, dtype=np.uint64, count=len(self._counts)),
+                counts=np.fromiter(self._counts.values(), dtype=np.int64, count=len(self._counts)),
+                token=np.array(json.dumps(token)),
+            )
+        os.replace(temp_path, path)
+
+    def load(self, path, token):
+        # Only trusts the saved index if the ledger files are exactly as
+        # they were when it was written.
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as saved:
+                if str(saved["token"]) != json.dumps(token):
+                    return False
+                self._counts = dict(zip(saved["keys"].tolist(), saved["counts"].tolist()))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return False
+        return True
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Forecasts many monthly series at once. history is a (months x series)
+# array; every method returns a (horizon x series) array. Fits are batched
+# over the series axis, so 500 series cost about as much as one.
+
+
+def linear(history, horizon, **options):
+    # Least-squares trend line per series, solved as one lstsq call.
+    months = len(history)
+    design = np.column_stack([np.ones(months), np.arange(months)])
+    coefficients = np.linalg.lstsq(design, history, rcond=None)[0]
+    future = np.column_stack([np.ones(horizon), np.arange(months, months + horizon)])
+    return future @ coefficients
+
+
+def seasonal(history, horizon, month_of_year=None, **options):
+    # Trend plus a month-of-year offset. Needs a year and a bit of history
+    # to say anything about seasons; with less it is the linear trend.
+    months = len(history)
+    if month_of_year is None or months < 14:
+        return linear(history, horizon)
+    month_of_year = np.asarray(month_of_year)
+    past, future = month_of_year[:months], month_of_year[months:months + horizon]
+
+    def design(steps, calendar):
+        dummies = (calendar[:, None] == np.arange(1, 12)[None, :]).astype(float)
+        return np.column_stack([np.ones(len(steps)), steps, dummies])
+
+    coefficients = np.linalg.lstsq(design(np.arange(months), past), history, rcond=None)[0]
+    return design(np.arange(months, months + horizon), future) @ coefficients
+
+
+def holt(history, horizon, alpha=0.5, beta=0.3, **options):
+    # Holt's linear exponential smoothing; the loop runs over months, with
+    # every series updated at once.
+    history = np.asarray(history, dtype=float)
+    level = history[0]
+    trend = history[1] - history[0] if len(history) > 1 else np.zeros_like(level)
+    for values in history[1:]:
+        previous = level
+        level = alpha * values + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous) + (1 - beta) * trend
+    return level + np.arange(1, horizon + 1)[:, None] * trend
+
+
+METHODS = {"linear": linear, "seasonal": seasonal, "holt": holt}
+
+
+def backtest(history, method="linear", holdout=3, **options):
+    # Mean absolute error per series when the last `holdout` months are
+    # forecast from the ones before them.
+    history = np.asarray(history, dtype=float)
+    predicted = forecast(history[:-holdout], holdout, method, **options)
+    return np.abs(predicted - history[-holdout:]).mean(axis=0)
+
+
+def forecast(history, horizon, method="linear", holdout=3, **options):
+    # method "auto" backtests every method and keeps the best one per series.
+    history = np.asarray(history, dtype=float)
+    if history.ndim == 1:
+        return forecast(history[:, None], horizon, method, holdout, **options)[:, 0]
+    if method == "auto":
+        if len(history) < 2 * holdout + 2:
+            return linear(history, horizon)
+        errors = np.stack([backtest(history, name, holdout, **options) for name in METHODS])
+        predictions = np.stack([forecast(history, horizon, name, **options) for name in METHODS])
+        best = errors.argmin(axis=0)
+        return predictions[best, :, np.arange(history.shape[1])].T
+    if method not in METHODS:
+        raise ValueError(f"Unknown forecast method: {method}")
+    return METHODS[method](history, horizon, **options)
@@ -0,0 +1,168 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNS, concat_ledgers, normalize
+
+
+CHUNK_SIZE = 50_000
+
+
+def _csv_chunks(path, chunk_size):
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as file:
+        for chunk in pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            yield chunk, file.tell() / size
+
+
+def _xlsx_chunks(path, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        total_rows = sheet.max_row or 0
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(value) if value is not None else "" for value in next(rows, ())]
+        batch, seen = [], 1
+        for row in rows:
+            batch.append(row)
+            seen += 1
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header), seen / total_rows if total_rows else 0
+                batch = []
+        if batch or seen == 1:
+            yield pd.DataFrame(batch, columns=header), 1.0
+    finally:
+        workbook.close()
+
+
+def iter_statement_chunks(path, chunk_size=CHUNK_SIZE):
+    # Yields (raw chunk, fraction of the file consumed so far).
+    if path.endswith(".csv"):
+        return _csv_chunks(path, chunk_size)
+    if path.endswith(".xlsx"):
+        return _xlsx_chunks(path, chunk_size)
+    raise ValueError("Unsupported file type!")
+
+
+def _blank_rows(chunk):
+    # Rows with nothing in any cell; openpyxl's max_row counts formatted
+    # empty rows, which read_excel used to drop.
+    blank = np.ones(len(chunk), dtype=bool)
+    for position in range(chunk.shape[1]):
+        values = chunk.iloc[:, position]
+        blank &= (values.isna() | (values.astype(str).str.strip() == "")).to_numpy()
+    return blank
+
+
+def validate_chunk(chunk):
+    # Returns (normalized valid rows, number of rejected rows). Blank rows
+    # are dropped, not rejected.
+    chunk = chunk[~_blank_rows(chunk)]
+    chunk = chunk.rename(columns=lambda column: str(column).strip())
+    missing = [column for column in COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    chunk = chunk[COLUMNS]
+
+    dates = pd.to_datetime(chunk["Date"], errors="coerce")
+    amounts = pd.to_numeric(chunk["Amount"], errors="coerce")
+    valid = dates.notna() & amounts.notna()
+    rows = chunk[valid].assign(Date=dates[valid], Amount=amounts[valid])
+    for column in ["Source", "Description", "Category", "Spender"]:
+        rows[column] = rows[column].fillna("").astype(str).str.strip()
+    return normalize(rows), int((~valid).sum())
+
+
+class DuplicateFilter:
+    # Flags incoming rows whose content is already in the ledger. Identical
+    # rows are counted, not collapsed: if the ledger holds two matching rows
+    # when the import starts, the statement's first two copies are duplicates
+    # and any further copies are new.
+    def __init__(self, model):
+        self.model = model
+        self._baseline = {}
+        self._seen = {}
+
+    def __call__(self, rows):
+        keys, counts = self.model.fingerprint_counts(rows)
+        duplicate = np.zeros(len(keys), dtype=bool)
+        for position, (key, count) in enumerate(zip(keys, counts)):
+            # Rows this import appended are in the ledger counts too, so
+            # compare against the count from before the import first saw key.
+            baseline = self._baseline.setdefault(key, count)
+            seen = self._seen.get(key, 0)
+            duplicate[position] = seen < baseline
+            self._seen[key] = seen + 1
+        return duplicate
+
+
+def import_statement(model, path, mode="merge", chunk_size=CHUNK_SIZE, task=None, dispatch=None):
+    # Streams a CSV/XLSX statement into the ledger one chunk at a time.
+    # mode is "merge" (append to the ledger) or "replace" (swap the ledger
+    # for the statement once all of it has been read, so a cancelled or
+    # failed replace changes nothing). task, if given, is polled for
+    # cancellation and fed progress; dispatch, if given, runs each ledger
+    # mutation on the thread that owns the model. Rows already in the
+    # ledger are not appended but returned under "duplicates" so the caller
+    # can report them or import them anyway. A merge that fails part-way
+    # returns the error under "error" with the rows added before it.
+    if mode not in ("merge", "replace"):
+        raise ValueError(f"Unknown import mode: {mode}")
+    dispatch = dispatch or (lambda fn, *args: fn(*args))
+
+    result = {"imported": 0, "rejected": 0, "sources": [], "duplicates": None, "cancelled": False, "error": None}
+    sources = set()
+    duplicates = []
+    staged = []
+    find_duplicates = DuplicateFilter(model)
+    chunks = iter_statement_chunks(path, chunk_size)
+    try:
+        for chunk, fraction in chunks:
+            if task is not None and task.cancelled:
+                result["cancelled"] = True
+                break
+            rows, rejected = validate_chunk(chunk)
+            result["rejected"] += rejected
+            if not rows.empty:
+                # Before the duplicate check, so a re-imported statement
+                # matches the rows its first import categorized.
+                rows = model.categorize(rows)
+                if mode == "replace":
+                    # Nothing to check against: the ledger is going.
+                    staged.append(rows)
+                else:
+                    duplicate = find_duplicates(rows)
+                    if duplicate.any():
+                        duplicates.append(rows[duplicate])
+                        rows = rows[~duplicate]
+                    dispatch(model.append_expenses, rows)
+                result["imported"] += len(rows)
+                sources.update(rows["Source"].unique())
+            if task is not None:
+                task.report_progress(100 * fraction)
+        if mode == "replace" and not result["cancelled"]:
+            data = concat_ledgers(staged)
+            if data is None:
+                dispatch(model.clear_data)
+            else:
+                dispatch(model.save_data, data)
+    except Exception as e:
+        if task is not None and task.cancelled:
+            # dispatch gave up on a mutation it hadn't handed over yet.
+            result["cancelled"] = True
+        elif mode == "merge" and result["imported"]:
+            result["error"] = e
+        else:
+            raise
+    finally:
+        chunks.close()
+
+    if result["cancelled"] and mode == "replace":
+        result["imported"] = 0
+        sources = set()
+    result["sources"] = sorted(sources)
+    result["duplicates"] = concat_ledgers(duplicates)
+    return result
@@ -1,15 +1,49 @@
+import time
+
+started = time.perf_counter()
+
+import os
+import sys
+
 from PyQt5.QtWidgets import QApplication
-from model import SpendTrackerModel
 from view import SpendTrackerView
-from controller import SpendTrackerController
-import sys
+
+
+def report_startup(marks):
+    # SPENDTRACKER_STARTUP_TIMING=1 prints how long each startup phase took.
+    # For a per-module breakdown run `python -X importtime main.py`.
+    if not os.environ.get("SPENDTRACKER_STARTUP_TIMING"):
+        return
+    previous = started
+    for name, mark in marks:
+        print(f"{name:>16}: {(mark - previous) * 1000:8.1f} ms", file=sys.stderr)
+        previous = mark
+    print(f"{'total':>16}: {(previous - started) * 1000:8.1f} ms", file=sys.stderr)
+
 
 def main():
+    marks = [("qt imports", time.perf_counter())]
     app = QApplication(sys.argv)
-    model = SpendTrackerModel()
     view = SpendTrackerView()
-    controller = SpendTrackerController(model, view)
     view.show()
+    app.processEvents()
+    marks.append(("first window", time.perf_counter()))
+
+    # The model pulls in pandas, so load it once the window is already up.
+    # Clicks in the meantime wait in the event queue until the controller
+    # has connected the buttons.
+    view.statusBar().showMessage("Loading expenses...")
+    from model import SpendTrackerModel
+    from controller import SpendTrackerController
+    marks.append(("model imports", time.perf_counter()))
+
+    model = SpendTrackerModel()
+    controller = SpendTrackerController(model, view)
+    view.statusBar().clearMessage()
+    marks.append(("ledger loaded", time.perf_counter()))
+    app.aboutToQuit.connect(controller.close)
+    app.aboutToQuit.connect(model.close)
+    report_startup(marks)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
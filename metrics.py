@@ -0,0 +1,191 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# In-process metrics for the hot paths. Every instrumented call records its
+# wall time, plus rows processed and bytes read or written where known.
+#
+#   SPENDTRACKER_PROFILE=cprofile,tracemalloc  also profile each operation
+#       (cProfile stats per operation, dumped to SPENDTRACKER_PROFILE_DIR,
+#       default "profiles") and record its peak traced memory
+#   SPENDTRACKER_METRICS=metrics.json  write summary() there on exit
+
+PROFILE_MODES = {mode.strip() for mode in os.environ.get("SPENDTRACKER_PROFILE", "").split(",") if mode.strip()}
+
+
+class MetricsRegistry:
+    # Keeps the latest `window` timings per operation for percentiles, and
+    # running totals for everything else.
+    def __init__(self, window=1000):
+        self.window = window
+        self._operations = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name, seconds, rows=None, size=None, peak_memory=None):
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = {
+                    "count": 0, "seconds": 0.0, "rows": 0, "bytes": 0, "peak_memory": 0,
+                    "recent": deque(maxlen=self.window),
+                }
+            operation["count"] += 1
+            operation["seconds"] += seconds
+            operation["recent"].append(seconds)
+            operation["rows"] += rows or 0
+            operation["bytes"] += size or 0
+            operation["peak_memory"] = max(operation["peak_memory"], peak_memory or 0)
+
+    def summary(self):
+        # {operation: {count, total, p50, p95, max, rows, bytes, peak_memory}},
+        # times in seconds.
+        with self._lock:
+            summary = {}
+            for name, operation in sorted(self._operations.items()):
+                recent = np.fromiter(operation["recent"], dtype=float)
+                summary[name] = {
+                    "count": operation["count"],
+                    "total": operation["seconds"],
+                    "p50": float(np.percentile(recent, 50)),
+                    "p95": float(np.percentile(recent, 95)),
+                    "max": float(recent.max()),
+                    "rows": operation["rows"],
+                    "bytes": operation["bytes"],
+                    "peak_memory": operation["peak_memory"],
+                }
+            return summary
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._profiles.clear()
+
+    def _profiler(self, name):
+        with self._lock:
+            return self._profiles.setdefault(name, cProfile.Profile())
+
+    def dump_profiles(self, directory=None):
+        directory = directory or os.environ.get("SPENDTRACKER_PROFILE_DIR", "profiles")
+        with self._lock:
+            profiles = dict(self._profiles)
+        if profiles:
+            os.makedirs(directory, exist_ok=True)
+        for name, profile in profiles.items():
+            profile.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _peaks(self):
+        # Peak traced memory so far of each operation on this thread's
+        # stack; see measure().
+        if not hasattr(self._local, "peaks"):
+            self._local.peaks = []
+        return self._local.peaks
+
+    def current(self):
+        # Name of the innermost operation being measured on this thread.
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def measure(self, name):
+        # Yields a dict; set "rows" and "bytes" in it to have them recorded.
+        # Only the outermost measured call on a thread is profiled, since a
+        # profiler can't be enabled twice.
+        details = {}
+        stack = self._stack()
+        profile = self._profiler(name) if "cprofile" in PROFILE_MODES and not stack else None
+        stack.append(name)
+        tracing = "tracemalloc" in PROFILE_MODES and tracemalloc.is_tracing()
+        start_memory = 0
+        if tracing:
+            # tracemalloc keeps one peak since it was last reset, so each
+            # operation resets it, and hands what it saw on to the one it is
+            # nested in.
+            start_memory, peak = tracemalloc.get_traced_memory()
+            peaks = self._peaks()
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            peaks.append(start_memory)
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield details
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            stack.pop()
+            peak_memory = None
+            if tracing:
+                peaks = self._peaks()
+                peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+                peak_memory = max(0, peak - start_memory)
+            self.record(name, seconds, details.get("rows"), details.get("bytes"), peak_memory)
+
+
+registry = MetricsRegistry()
+
+
+def instrumented(name, rows=None, size=None):
+    # Records each call under `name`. rows and size, if given, are called
+    # as rows(result, *args, **kwargs) to report rows processed and bytes
+    # read or written.
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with registry.measure(name) as details:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    details["rows"] = rows(result, *args, **kwargs)
+                if size is not None:
+                    details["bytes"] = size(result, *args, **kwargs)
+                return result
+        return wrapper
+    return decorate
+
+
+def format_summary(summary):
+    lines = [f"{'operation':<48} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'rows':>10} {'bytes':>12}"]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<48} {stats['count']:>7} {stats['p50'] * 1000:>9.2f} {stats['p95'] * 1000:>9.2f} "
+            f"{stats['rows']:>10} {stats['bytes']:>12}"
+        )
+    return "\n".join(lines)
+
+
+def result_rows(result, *args, **kwargs):
+    return len(result) if result is not None else 0
+
+
+def _write_on_exit():
+    path = os.environ.get("SPENDTRACKER_METRICS")
+    if path:
+        with open(path, "w") as file:
+            json.dump(registry.summary(), file, indent=2)
+    if "cprofile" in PROFILE_MODES:
+        registry.dump_profiles()
+
+
+if "tracemalloc" in PROFILE_MODES and not tracemalloc.is_tracing():
+    tracemalloc.start()
+atexit.register(_write_on_exit)
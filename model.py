@@ -2,23 +2,195 @@ import pandas as pd
 import os
 import json
 import numpy as np
+import threading
+from alerts import LimitMonitor
+from cache import ResultCache
+from cube import CUBE_KEYS, AggregateCube
+from fingerprints import FINGERPRINT_COLUMNS, FingerprintIndex, fingerprint
+from forecast import forecast
+from metrics import instrumented, registry, result_rows
+from parallel import ParallelAggregator
+from query import INDEX_COLUMNS, VALUE_COLUMNS, LedgerIndex
+from rules import RuleSet, make_rule
+from search import DescriptionIndex
+from snapshot import open_snapshot, write_snapshot
+from storage import (
+    COLUMNS, DATE_FORMAT, CsvSpendStore, append_durably, coerce_value, concat_ledgers, default_store, normalize, to_cents
+)
 
 
 class SpendTrackerModel:
-    def __init__(self):
-        self.data_file = "spend_data.csv"  
+    def __init__(self, storage=None):
+        self.storage = storage or default_store()
+        self.data_file = self.storage.path
+        self.journal_file = "spend_data.journal"
+        self.fingerprint_file = "spend_data.fingerprints"
+        # Read-only memory-mapped copy for totals; see snapshot.py. Only
+        # used while it matches the ledger files exactly.
+        self.snapshot_dir = "spend_data.snapshot"
+        self._snapshot = None
         self.credit_limits_file = "credit_limits.json"
-        self.columns = ["Date", "Source", "Description", "Category", "Spender", "Amount"]  # Column names
+        self.columns = COLUMNS  # Column names
         self.credit_limits = self._load_credit_limits()
         self.budget_file = "budget_limits.json"
         self.budgets = self._load_budget_limits()
+        self.monthly_budget_file = "monthly_budget.json"
+        self.monthly_budgets = self._load_monthly_budgets()
+        self.rules_file = "category_rules.json"
+        self.rules = RuleSet(self.rules_file)
 
-        if not os.path.exists(self.data_file):
+        # Rows are addressed by stable ids (the frame index): a row's position
+        # in the data file. Edits and deletes go to the journal until compact().
+        self.compaction_threshold = 1000
+        self._data = None
+        self._signature = None
+        self._next_row_id = 0
+        self._journal_entries = 0
+        self.version = 0
+        # Held for every read and mutation so background workers can query
+        # the model while the GUI thread edits it.
+        self._lock = threading.RLock()
+
+        # Listeners are called as listener(event, before, after) after every
+        # mutation; see _notify().
+        self._listeners = []
+        self.cube = AggregateCube()
+        self.subscribe(self.cube.on_ledger_changed)
+        self.fingerprints = FingerprintIndex()
+        self.subscribe(self.fingerprints.on_ledger_changed)
+        self.alerts = LimitMonitor(self._group_sum, self._alert_limits)
+        self.subscribe(self.alerts.on_ledger_changed)
+        self.index = LedgerIndex()
+        self.subscribe(self.index.on_ledger_changed)
+        self.search_index = DescriptionIndex()
+        self.subscribe(self.search_index.on_ledger_changed)
+        # Totals over at least parallel_min_rows rows are spread over
+        # worker processes when SPENDTRACKER_WORKERS (or
+        # parallel.set_workers()) asks for more than one.
+        self.parallel = ParallelAggregator()
+        self.parallel_min_rows = 1_000_000
+        # Derived results (pivots, top-N lists) keyed on the ledger version.
+        self.results = ResultCache()
+
+        if not self.storage.exists():
             self._initialize_data()
 
     def _initialize_data(self):
-        df = pd.DataFrame(columns=self.columns)
-        df.to_csv(self.data_file, index=False)
+        legacy_store = CsvSpendStore()
+        if not isinstance(self.storage, CsvSpendStore) and legacy_store.exists():
+            # One-shot migration of an existing CSV ledger (and its journal).
+            self.storage.write(self._read_ledger(legacy_store).reset_index(drop=True))
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        else:
+            self.storage.write(normalize(pd.DataFrame(columns=self.columns)))
+
+    def _file_signature(self):
+        journal = None
+        if os.path.exists(self.journal_file):
+            stat = os.stat(self.journal_file)
+            journal = stat.st_mtime_ns, stat.st_size
+        return self.storage.signature(), journal
+
+    def _disk_signature(self):
+        # Like _file_signature(), but comparable across sessions.
+        if hasattr(self.storage, "disk_signature"):
+            return self.storage.disk_signature(), self._file_signature()[1]
+        return self._file_signature()
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event, before=None, after=None):
+        # event is "append" (after = new rows), "update" (before/after = the
+        # touched rows), "delete" (before = removed rows), "reindex" (row ids
+        # were renumbered, contents unchanged) or "reset" (reload everything).
+        for listener in list(self._listeners):
+            listener(event, before, after)
+
+    def _sync(self):
+        # Drop everything derived from the store if it changed behind our back.
+        if not self.storage.exists():
+            self._initialize_data()
+        signature = self._file_signature()
+        if signature != self._signature:
+            self._data = None
+            self._signature = signature
+            self.version += 1
+            self._notify("reset")
+
+    def _mark_saved(self):
+        self._signature = self._file_signature()
+        self.version += 1
+
+    def _ledger(self):
+        self._sync()
+        if self._data is None:
+            self._data = self._read_ledger(self.storage)
+            # Reading may have cleaned up a stale journal.
+            self._signature = self._file_signature()
+        return self._data
+
+    def _cached_ledger(self):
+        # Stores that support updates don't need the ledger resident; only
+        # keep the cache in step if it is already loaded.
+        self._sync()
+        return self._data
+
+    def _rows(self, row_ids):
+        if self._data is not None:
+            return self._data.loc[self._data.index.intersection(row_ids)]
+        return self.storage.read_rows(row_ids)
+
+    def _read_ledger(self, storage):
+        data = storage.read()
+        self._next_row_id = int(data.index.max()) + 1 if len(data) else 0
+        entries = self._read_journal(len(data))
+        self._journal_entries = len(entries)
+
+        deleted = []
+        for entry in entries:
+            if entry["op"] == "update":
+                self._set_cell(data, entry["row"], entry["column"], coerce_value(entry["column"], entry["value"]))
+            elif entry["op"] == "delete":
+                deleted.extend(entry["rows"])
+        return data.drop(index=deleted, errors="ignore")
+
+    def _read_journal(self, stored_rows):
+        if not os.path.exists(self.journal_file):
+            return []
+        entries = []
+        with open(self.journal_file, "r") as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # torn last entry
+        # A compaction that rewrote the store but died before removing the
+        # journal has already folded these entries in. Replaying its updates
+        # is harmless; its deletes would make the compacted store shorter.
+        if entries and entries[-1]["op"] == "compact":
+            marker = entries.pop()
+            if marker["rows"] == stored_rows and any(entry["op"] == "delete" for entry in entries):
+                os.remove(self.journal_file)
+                return []
+        return entries
+
+    def _write_journal(self, entry):
+        payload = (json.dumps(entry) + "\n").encode()
+        with registry.measure("model.write_journal") as details:
+            append_durably(self.journal_file, lambda empty: payload)
+            details["bytes"] = len(payload)
+        self._journal_entries += 1
+
+    @staticmethod
+    def _set_cell(data, row_id, column, value):
+        if isinstance(data[column].dtype, pd.CategoricalDtype) and value not in data[column].cat.categories:
+            data[column] = data[column].cat.add_categories([value])
+        data.at[row_id, column] = value
 
     def _load_credit_limits(self):
         if os.path.exists(self.credit_limits_file):
@@ -30,11 +202,169 @@ class SpendTrackerModel:
         with open(self.credit_limits_file, "w") as file:
             json.dump(self.credit_limits, file, indent=4)
 
-    def load_data(self):
-        return pd.read_csv(self.data_file)
+    @instrumented("model.load_data", rows=result_rows)
+    def load_data(self, columns=None):
+        # Read-only views: the frame shares the cached ledger's arrays, and
+        # the model never writes into arrays it has handed out (see
+        # update_cell()), so callers must not either.
+        with self._lock:
+            data = self._ledger()
+            if columns is not None:
+                return pd.DataFrame({column: data[column] for column in columns}, index=data.index, copy=False)
+            return data.copy(deep=False)
 
+    @instrumented("model.save_data", rows=lambda result, model, data: len(data))
     def save_data(self, data):
-        data.to_csv(self.data_file, index=False)
+        with self._lock:
+            data = normalize(data).reset_index(drop=True)
+            self.storage.write(data)
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self._data = data
+            self._next_row_id = len(data)
+            self._journal_entries = 0
+            self._mark_saved()
+            self._notify("reset")
+
+    @instrumented("model.export_csv", size=lambda result, model, path: os.path.getsize(path))
+    def export_csv(self, path):
+        CsvSpendStore(path).write(self.load_data())
+
+    @instrumented("model.append_expenses", rows=result_rows)
+    def append_expenses(self, rows):
+        with self._lock:
+            new_rows = normalize(pd.DataFrame(rows, columns=self.columns))
+            if new_rows.empty:
+                return new_rows
+            if self.storage.supports_updates:
+                data = self._cached_ledger()
+                self._next_row_id = self.storage.next_row_id()
+            else:
+                data = self._ledger()
+
+            new_rows.index = pd.RangeIndex(self._next_row_id, self._next_row_id + len(new_rows))
+            if self.storage.append(new_rows):
+                self._data = None
+                self._signature = None
+                self._ledger()
+                return new_rows
+
+            self._next_row_id += len(new_rows)
+            if data is not None:
+                self._data = concat_ledgers([data, new_rows])
+            self._mark_saved()
+            self._notify("append", after=new_rows)
+            return new_rows
+
+    @instrumented("model.update_cell")
+    def update_cell(self, row_id, column, value):
+        with self._lock:
+            if column not in self.columns:
+                raise KeyError(column)
+            value = coerce_value(column, value)
+            if self.storage.supports_updates:
+                data = self._cached_ledger()
+                before = self._rows([row_id])
+                self.storage.update_cell(row_id, column, value)
+            else:
+                data = self._ledger()
+                if row_id not in data.index:
+                    raise KeyError(row_id)
+                before = self._rows([row_id])
+                journal_value = value.strftime(DATE_FORMAT) if column == "Date" else value
+                self._write_journal({"op": "update", "row": int(row_id), "column": column, "value": journal_value})
+            after = before.copy()
+            self._set_cell(after, row_id, column, value)
+            if data is not None:
+                # Edit a copy of the column, so frames from load_data() keep
+                # the value they were handed.
+                data = data.copy(deep=False)
+                data[column] = data[column].copy()
+                self._set_cell(data, row_id, column, value)
+                self._data = data
+            self._mark_saved()
+            self._notify("update", before, after)
+
+    @instrumented("model.delete_rows", rows=lambda result, model, row_ids: len(row_ids))
+    def delete_rows(self, row_ids):
+        with self._lock:
+            row_ids = [int(row_id) for row_id in row_ids]
+            if not row_ids:
+                return
+            if self.storage.supports_updates:
+                data = self._cached_ledger()
+                before = self._rows(row_ids)
+                self.storage.delete_rows(row_ids)
+            else:
+                data = self._ledger()
+                before = self._rows(row_ids)
+                self._write_journal({"op": "delete", "rows": row_ids})
+            if data is not None:
+                self._data = data.drop(index=row_ids, errors="ignore")
+            self._mark_saved()
+            self._notify("delete", before=before)
+
+    @instrumented("model.compact")
+    def compact(self):
+        with self._lock:
+            data = self._ledger()
+            if not self._journal_entries:
+                return False
+            data = data.reset_index(drop=True)
+            self._write_journal({"op": "compact", "rows": len(data)})
+            self.storage.write(data)
+            os.remove(self.journal_file)
+
+            self._data = data
+            self._next_row_id = len(data)
+            self._journal_entries = 0
+            self._mark_saved()
+            self._notify("reindex")
+            return True
+
+    def maybe_compact(self):
+        if self._journal_entries >= self.compaction_threshold:
+            return self.compact()
+        return False
+
+    def close(self):
+        # Leaves the files in a state the next session can pick up cheaply.
+        with self._lock:
+            self.compact()
+            if hasattr(self.storage, "close"):
+                self.storage.close()
+            if os.path.exists(self.snapshot_dir) and self.snapshot() is None:
+                # Whoever wrote the snapshot will want it current. After the
+                # store's close(), which may rewrite its files.
+                self.write_snapshot()
+            if self.fingerprints.is_built():
+                self.fingerprints.save(self.fingerprint_file, self._disk_signature())
+            self.parallel.close()
+
+    def _fingerprint_index(self):
+        self._sync()
+        if not self.fingerprints.is_built() and not self.fingerprints.load(self.fingerprint_file, self._disk_signature()):
+            self.fingerprints.build(self.load_data(columns=FINGERPRINT_COLUMNS))
+        return self.fingerprints
+
+    @instrumented("model.fingerprint_counts", rows=lambda result, model, rows: len(rows))
+    def fingerprint_counts(self, rows):
+        # Returns (fingerprints of rows, how many ledger rows share each).
+        keys = fingerprint(rows).tolist()
+        with self._lock:
+            return keys, self._fingerprint_index().counts(keys)
+
+    @instrumented("model.categorize", rows=lambda result, model, rows: len(rows))
+    def categorize(self, rows):
+        # Returns rows with the categorization rules applied; see RuleSet.
+        return self.rules.apply(rows)
+
+    def add_rule(self, pattern, category=None, spender=None, field="Description", regex=False, override=False,
+                 position=None):
+        self.rules.add(make_rule(pattern, category, spender, field, regex, override), position)
+
+    def delete_rule(self, position):
+        self.rules.remove(position)
 
     def clear_data(self):
         df = pd.DataFrame(columns=self.columns)
@@ -49,9 +379,217 @@ class SpendTrackerModel:
             del self.credit_limits[card]
             self._save_credit_limits()
 
+    def snapshot(self):
+        # The ledger's snapshot, or None if there is none or the ledger has
+        # changed since it was written.
+        with self._lock:
+            self._sync()
+            token = self._disk_signature()
+            if self._snapshot is None or self._snapshot.token != json.dumps(token):
+                self._snapshot = open_snapshot(self.snapshot_dir, token)
+            return self._snapshot
+
+    @instrumented("model.write_snapshot", rows=lambda result, model: result.rows)
+    def write_snapshot(self):
+        with self._lock:
+            write_snapshot(self._ledger(), self.snapshot_dir, self._disk_signature())
+            self._snapshot = None
+            return self.snapshot()
+
+    @instrumented("model.group_totals", rows=result_rows)
+    def _group_totals(self, keys, month=None):
+        # The lock is only held to pick what to read: snapshots are
+        # immutable, stores lock their own reads, and the in-memory total
+        # works on a shallow copy of the ledger.
+        with self._lock:
+            snapshot = self.snapshot()
+        if snapshot is not None:
+            parallel = self.parallel if self.parallel.enabled() and snapshot.rows >= self.parallel_min_rows else None
+            totals = snapshot.group_totals(keys, month, parallel)
+            if totals is not None:
+                return totals
+        with self._lock:
+            self._sync()
+            storage = self.storage if hasattr(self.storage, "group_totals") else None
+            if storage is None:
+                columns = ["Date" if key == "Month" else key for key in keys]
+                if month is not None:
+                    columns.append("Date")
+                data = self.load_data(columns=list(dict.fromkeys(columns + ["Amount"])))
+        if storage is not None:
+            return storage.group_totals(keys, month)
+        if month is not None:
+            data = data[data["Date"].dt.to_period("M") == month]
+        return self._total_by(data, keys)
+
+    @staticmethod
+    def _sum_by(data, keys):
+        if "Month" in keys:
+            data["Month"] = data["Date"].dt.to_period("M")
+        data["Amount"] = to_cents(data["Amount"])
+        # Missing keys are a group of their own; see AggregateCube.
+        totals = data.groupby(keys, observed=True, dropna=False)["Amount"].agg(["sum", "count"])
+        return totals.assign(sum=totals["sum"] / 100).rename(columns={"sum": "Amount", "count": "Count"})
+
+    @staticmethod
+    def _known(totals):
+        # A breakdown by keys leaves out the rows missing one of them, as
+        # groupby does; totals over every row still count them.
+        index = totals.index
+        return totals[np.all([index.get_level_values(level).notna() for level in range(index.nlevels)], axis=0)]
+
+    def _total_by(self, data, keys):
+        if self.parallel.enabled() and len(data) >= self.parallel_min_rows:
+            totals = self.parallel.group_totals(data, keys)
+            if totals is not None:
+                return totals
+        return self._sum_by(data, keys)
+
+    def _prepare(self, name, columns):
+        # Builds the index in self.<name> (a LedgerIndex or DescriptionIndex)
+        # from a shallow copy of the ledger without holding the lock, so the
+        # GUI thread isn't kept waiting on a worker's first query. The index
+        # is only installed if the ledger hasn't changed meanwhile; if it
+        # has, the caller builds it under the lock as before.
+        with self._lock:
+            self._sync()
+            index = getattr(self, name)
+            if index.is_built():
+                return
+            version, rows = self.version, self.load_data(columns=columns)
+        fresh = type(index)()
+        fresh.build(rows)
+        with self._lock:
+            self._sync()
+            if self.version == version and getattr(self, name) is index and not index.is_built():
+                self._listeners[self._listeners.index(index.on_ledger_changed)] = fresh.on_ledger_changed
+                setattr(self, name, fresh)
+
+    def _prepare_indexes(self, text, conditions):
+        # Builds the indexes a query_row_ids() call with these filters uses.
+        if text is not None:
+            self._prepare("search_index", ["Description"])
+        if text is None or any(condition is not None for condition in conditions):
+            self._prepare("index", INDEX_COLUMNS)
+
+    def _query_index(self):
+        self._sync()
+        if not self.index.is_built():
+            self.index.build(self.load_data(columns=INDEX_COLUMNS))
+        return self.index
+
+    def _search_index(self):
+        self._sync()
+        if not self.search_index.is_built():
+            self.search_index.build(self.load_data(columns=["Description"]))
+        return self.search_index
+
+    @instrumented("model.search", rows=result_rows)
+    def search(self, text):
+        # Row ids, in ledger order, of the expenses whose description
+        # matches text: words match as word prefixes and "quoted words" as
+        # a phrase.
+        self._prepare("search_index", ["Description"])
+        with self._lock:
+            return self._search_index().search(text)
+
+    @instrumented("model.query_row_ids", rows=result_rows)
+    def query_row_ids(self, start=None, end=None, min_amount=None, max_amount=None, category=None, spender=None, source=None,
+                      text=None):
+        # Row ids, in ledger order, of the expenses dated start to end and
+        # costing min_amount to max_amount (bounds are inclusive and may be
+        # left out), whose category, spender and source are the given value
+        # or one of the given values, and whose description matches text
+        # as for search().
+        conditions = (start, end, min_amount, max_amount, category, spender, source)
+        self._prepare_indexes(text, conditions)
+        with self._lock:
+            if text is None:
+                return self._query_index().select(*conditions)
+            row_ids = self.search(text)
+            if any(condition is not None for condition in conditions):
+                row_ids = np.intersect1d(row_ids, self._query_index().select(*conditions), assume_unique=True)
+            return row_ids
+
+    @instrumented("model.query", rows=result_rows)
+    def query(self, columns=None, **filters):
+        # The matching rows themselves; filters as for query_row_ids().
+        self._prepare_indexes(filters.get("text"), [value for key, value in filters.items() if key != "text"])
+        with self._lock:
+            row_ids = self.query_row_ids(**filters)
+            data = self.load_data(columns=columns) if columns is not None else self.load_data()
+        return data.loc[row_ids]
+
+    def query_totals(self, keys, **filters):
+        # Amount totals by keys over the matching rows, like _group_sum().
+        columns = ["Date" if key == "Month" else key for key in keys]
+        data = self.query(columns=list(dict.fromkeys(columns + ["Amount"])), **filters)
+        if not keys:
+            return to_cents(data["Amount"]).sum() / 100
+        return self._known(self._total_by(data, keys)["Amount"])
+
+    def current_version(self):
+        with self._lock:
+            self._sync()
+            return self.version
+
+    def cached(self, query, compute):
+        # Returns (ledger version, result), computing the result only if it
+        # isn't cached for the current version. compute() runs without the
+        # lock; if the ledger changed meanwhile its result isn't cached.
+        version = self.current_version()
+        missing = object()
+        result = self.results.get(query, version, missing)
+        if result is missing:
+            result = compute()
+            if self.current_version() == version:
+                self.results.put(query, version, result)
+        return version, result
+
+    def _prepare_cube(self):
+        # Totals the ledger for the cube without holding the lock, as
+        # _prepare() does for the indexes.
+        with self._lock:
+            self._sync()
+            if self.cube.is_built():
+                return
+            version = self.version
+        totals = self._group_totals(CUBE_KEYS)
+        with self._lock:
+            self._sync()
+            if self.version == version and not self.cube.is_built():
+                self.cube.build(totals)
+
+    def _aggregates(self):
+        self._sync()
+        if not self.cube.is_built():
+            self.cube.build(self._group_totals(CUBE_KEYS))
+        return self.cube
+
+    def _group_sum(self, keys, month=None, filters=None):
+        if filters:
+            if month is not None:
+                filters = dict(
+                    filters,
+                    start=max(pd.Timestamp(filters.get("start") or month.start_time), month.start_time),
+                    end=min(pd.Timestamp(filters.get("end") or month.end_time), month.end_time),
+                )
+            return self.query_totals(keys, **filters)
+        with self._lock:
+            self._sync()
+            by_month = month is not None and not self.cube.is_built() and hasattr(self.storage, "group_totals")
+        if by_month:
+            # Nothing aggregated yet: total just that month (one partition
+            # or an indexed range) rather than building the whole cube.
+            totals = self._group_totals(keys or ["Month"], month)["Amount"]
+            return self._known(totals) if keys else totals.sum()
+        self._prepare_cube()
+        with self._lock:
+            return self._aggregates().slice(keys, month)
+
+    @instrumented("model.calculate_credit_summary")
     def calculate_credit_summary(self):
-        data = self.load_data()
-        credit_usage = data.groupby("Source")["Amount"].sum().to_dict()
+        credit_usage = self._group_sum(["Source"]).to_dict()
         credit_summary = {
             card: {
                 "Used": credit_usage.get(card, 0),
@@ -61,61 +599,84 @@ class SpendTrackerModel:
         }
         return credit_summary
 
-    def calculate_totals(self):
-        data = self.load_data()
-        total_expense = data["Amount"].sum()
-        spender_expense = data.groupby("Spender")["Amount"].sum().to_dict()
-        category_expense = data.groupby("Category")["Amount"].sum().to_dict()
+    @instrumented("model.calculate_totals")
+    def calculate_totals(self, filters=None):
+        # filters, here and below, restricts the totals to the rows matching
+        # query_row_ids(**filters).
+        total_expense = self._group_sum([], filters=filters)
+        spender_expense = self._group_sum(["Spender"], filters=filters).to_dict()
+        category_expense = self._group_sum(["Category"], filters=filters).to_dict()
         return total_expense, spender_expense, category_expense
 
-    def calculate_monthly_expenses(self):
-        data = self.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        return data.groupby(data["Date"].dt.to_period("M"))["Amount"].sum()
-
-    def calculate_monthly_category_expenses(self):
-        data = self.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        data["Month"] = data["Date"].dt.to_period("M")
-        return data.groupby(["Month", "Category"])["Amount"].sum().unstack(fill_value=0)
-
-    def calculate_monthly_spender_expenses(self):
-        data = self.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        data["Month"] = data["Date"].dt.to_period("M")
-        return data.groupby(["Month", "Spender"])["Amount"].sum().unstack(fill_value=0)
-
-    def calculate_monthly_card_expenses(self):
-        data = self.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        data["Month"] = data["Date"].dt.to_period("M")
-        return data.groupby(["Month", "Source"])["Amount"].sum().unstack(fill_value=0)
+    @instrumented("model.calculate_monthly_expenses")
+    def calculate_monthly_expenses(self, filters=None):
+        return self._group_sum(["Month"], filters=filters)
+
+    @instrumented("model.calculate_monthly_category_expenses")
+    def calculate_monthly_category_expenses(self, filters=None):
+        return self._group_sum(["Month", "Category"], filters=filters).unstack(fill_value=0)
+
+    @instrumented("model.calculate_monthly_spender_expenses")
+    def calculate_monthly_spender_expenses(self, filters=None):
+        return self._group_sum(["Month", "Spender"], filters=filters).unstack(fill_value=0)
+
+    @instrumented("model.calculate_monthly_card_expenses")
+    def calculate_monthly_card_expenses(self, filters=None):
+        return self._group_sum(["Month", "Source"], filters=filters).unstack(fill_value=0)
     
-    def calculate_expense_trends(self):
-        data = self.load_data()
-        data["Date"] = pd.to_datetime(data["Date"])
-        return data.groupby(data["Date"].dt.to_period("M"))["Amount"].sum()
+    @instrumented("model.calculate_expense_trends")
+    def calculate_expense_trends(self, filters=None):
+        return self._group_sum(["Month"], filters=filters)
 
-    def forecast_expenses(self, months_ahead=3):
-        trends = self.calculate_expense_trends()
-        X = np.arange(len(trends))
-        y = trends.values
+    @instrumented("model.calculate_daily_expenses")
+    def calculate_daily_expenses(self, filters=None):
+        if filters:
+            return self.query_totals(["Date"], **filters)
+        return self._known(self._group_totals(["Date"])["Amount"])
 
-        if len(X) < 2: 
-            return None
+    def filter_values(self):
+        # {column: values in the ledger} for the columns query_row_ids()
+        # filters on by value.
+        return {column: [str(value) for value in self._group_sum([column]).index] for column in VALUE_COLUMNS}
 
-        # Calculate coefficients for linear regression
-        X_mean = np.mean(X)
-        y_mean = np.mean(y)
-        slope = np.sum((X - X_mean) * (y - y_mean)) / np.sum((X - X_mean) ** 2)
-        intercept = y_mean - slope * X_mean
+    def latest_month(self):
+        with self._lock:
+            self._sync()
+            if hasattr(self.storage, "months") and not self.cube.is_built():
+                months = self.storage.months()
+                return months[-1] if months else None
+        months = self._group_sum(["Month"]).index
+        return months.max() if len(months) else None
 
-        # Forecast future expenses
-        future_indices = np.arange(len(trends), len(trends) + months_ahead)
-        predictions = slope * future_indices + intercept
+    @instrumented("model.forecast_expenses")
+    def forecast_expenses(self, months_ahead=3, method="linear"):
+        trends = self.calculate_expense_trends()
+        if len(trends) < 2:
+            return None
 
+        predictions = forecast(trends.to_numpy(), months_ahead, method, month_of_year=self._month_of_year(trends.index, months_ahead))
         forecasted_months = [(trends.index[-1] + i).strftime("%Y-%m") for i in range(1, months_ahead + 1)]
         return dict(zip(forecasted_months, predictions))
+
+    @instrumented("model.forecast_series")
+    def forecast_series(self, by="Category", months_ahead=3, method="linear"):
+        # Forecasts every category, spender or card (by = "Category",
+        # "Spender" or "Source") in one batched fit. Returns (history,
+        # forecast) frames with a month row per column of that key.
+        history = self._group_sum(["Month", by]).unstack(fill_value=0)
+        if len(history) < 2:
+            return None
+        predictions = forecast(
+            history.to_numpy(), months_ahead, method,
+            month_of_year=self._month_of_year(history.index, months_ahead)
+        )
+        future = pd.period_range(history.index[-1] + 1, periods=months_ahead, freq="M")
+        return history, pd.DataFrame(predictions, index=future, columns=history.columns)
+
+    @staticmethod
+    def _month_of_year(months, months_ahead):
+        future = pd.period_range(months[-1] + 1, periods=months_ahead, freq="M")
+        return np.concatenate([months.month, future.month])
     
     def _load_budget_limits(self):
         if os.path.exists(self.budget_file):
@@ -127,6 +688,15 @@ class SpendTrackerModel:
         with open(self.budget_file, "w") as file:
             json.dump(self.budgets, file, indent=4)
 
+    def _load_monthly_budgets(self):
+        if os.path.exists(self.monthly_budget_file):
+            with open(self.monthly_budget_file, "r") as file:
+                return json.load(file)
+        return {}
+
+    def _alert_limits(self):
+        return {"budget": self.budgets, "credit": self.credit_limits, "monthly": self.monthly_budgets}
+
     def set_budget_limit(self, category, limit):
         if not hasattr(self, 'budget_limits'):
             self.budget_limits = {}
@@ -137,9 +707,9 @@ class SpendTrackerModel:
             del self.budgets[category]
             self._save_budget_limits()
 
+    @instrumented("model.calculate_budget_usage")
     def calculate_budget_usage(self):
-        data = self.load_data()
-        category_usage = data.groupby("Category")["Amount"].sum().to_dict()
+        category_usage = self._group_sum(["Category"]).to_dict()
         budget_summary = {
             category: {
                 "Limit": self.budgets.get(category, None),
@@ -151,11 +721,13 @@ class SpendTrackerModel:
         }
         return budget_summary
     
-    def calculate_budget_summary(self, data):
+    @instrumented("model.calculate_budget_summary")
+    def calculate_budget_summary(self, month=None):
         if not hasattr(self, 'budget_limits'):
             return {}
 
-        category_usage = data.groupby("Category")["Amount"].sum().to_dict()
+        month = month if month is not None else self.latest_month()
+        category_usage = self._group_sum(["Category"], month).to_dict() if month is not None else {}
         budget_summary = {
             category: {
                 "Used": category_usage.get(category, 0),
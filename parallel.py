@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Multi-process group totals for very large ledgers. The key and amount
+# columns are copied once into shared memory; each worker process attaches
+# to them and totals a range of rows, so nothing but block names and the
+# small partial results is pickled. Amounts are summed as integer cents,
+# so merging the partials gives exactly what the serial groupby gives.
+#
+#   SPENDTRACKER_WORKERS=8  worker processes (default 0: aggregate serially)
+
+DENSE_GROUPS = 1 << 22
+EXACT_FLOAT = 1 << 53
+
+
+def keys_and_cents(arrays, dimensions, days=None):
+    # (group keys, cents) per row of arrays: "Date" as datetime64 or as
+    # int32 days, categorical codes, and "Amount" or "Cents". Keys combine
+    # the dimension codes row-major; a missing key takes the last code of
+    # its dimension, so those rows still count, like groupby(dropna=False).
+    # days=(first, last) keeps only rows dated in that range, for int32
+    # days.
+    cents = arrays["Cents"] if "Cents" in arrays else np.round(arrays["Amount"] * 100).astype("int64")
+    valid = np.ones(len(cents), dtype=bool)
+    if days is not None:
+        valid &= (arrays["Date"] >= days[0]) & (arrays["Date"] <= days[1])
+    key = np.zeros(len(valid), dtype="int64")
+    for name, offset, size in dimensions:
+        if name == "Month":
+            dates = arrays["Date"]
+            if dates.dtype.kind == "M":
+                missing = np.isnat(dates)
+            else:
+                missing = dates == np.iinfo(dates.dtype).min
+                dates = dates.astype("datetime64[D]")
+            codes = np.where(missing, size - 1, dates.astype("datetime64[M]").astype("int64") - offset)
+        else:
+            codes = arrays[name].astype("int64")
+            codes = np.where(codes < 0, size - 1, codes)
+        key = key * size + codes
+    return key[valid], cents[valid]
+
+
+def partial_totals(key, cents, dimensions):
+    # (group keys, cent sums, row counts), in key order.
+    groups = int(np.prod([size for _, _, size in dimensions]))
+    if groups <= DENSE_GROUPS and int(np.abs(cents).sum()) < EXACT_FLOAT:
+        # Below 2**53 every partial sum is an exact float.
+        counts = np.bincount(key, minlength=groups)
+        present = np.flatnonzero(counts)
+        sums = np.bincount(key, weights=cents, minlength=groups)[present].astype("int64")
+        return present, sums, counts[present]
+    return merge_totals([(key, cents, np.ones(len(key), dtype="int64"))])
+
+
+def range_totals(blocks, dimensions, start, stop):
+    # Runs in a worker: partial_totals() over rows start:stop of the
+    # shared columns.
+    memories = {name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in blocks.items()}
+    try:
+        key, cents = keys_and_cents({
+            name: np.ndarray(length, dtype=dtype, buffer=memories[name].buf)[start:stop]
+            for name, (_, dtype, length) in blocks.items()
+        }, dimensions)
+    finally:
+        for memory in memories.values():
+            memory.close()
+    return partial_totals(key, cents, dimensions)
+
+
+def merge_totals(partials):
+    # Sums (keys, sums, counts) partials by key, in key order.
+    keys, sums, counts = (np.concatenate([partial[part] for partial in partials]) for part in range(3))
+    if not len(keys):
+        return keys, sums, counts
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+    return keys[starts], np.add.reduceat(sums[order], starts), np.add.reduceat(counts[order], starts)
+
+
+class ParallelAggregator:
+    # group_totals(data, keys) is _sum_by() spread over worker processes.
+    # Keys are Month and categorical columns; anything else returns None
+    # for the caller to total serially.
+    def __init__(self, workers=None):
+        self.workers = int(os.environ.get("SPENDTRACKER_WORKERS", "0")) if workers is None else workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.workers > 1
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the GUI process has Qt threads running.
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def set_workers(self, workers):
+        if workers != self.workers:
+            self.close()
+            self.workers = workers
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def group_totals(self, data, keys):
+        if data.empty or not keys or not all(
+            key == "Month" or isinstance(data[key].dtype, pd.CategoricalDtype) for key in keys
+        ):
+            return None
+
+        arrays = {"Amount": data["Amount"].to_numpy(dtype="float64")}
+        dimensions = []
+        for key in keys:
+            if key == "Month":
+                dates = data["Date"].to_numpy(dtype="datetime64[ns]")
+                arrays["Date"] = dates
+                dimensions.append(month_dimension(dates))
+            else:
+                arrays[key] = data[key].cat.codes.to_numpy()
+                dimensions.append((key, 0, len(data[key].cat.categories) + 1))
+
+        memories = []
+        try:
+            blocks = {}
+            for name, array in arrays.items():
+                memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                memories.append(memory)
+                np.ndarray(len(array), dtype=array.dtype, buffer=memory.buf)[:] = array
+                blocks[name] = (memory.name, array.dtype.str, len(array))
+            totals = self.map_ranges(range_totals, len(data), blocks, dimensions)
+        finally:
+            for memory in memories:
+                memory.close()
+                memory.unlink()
+        return frame_totals(keys, dimensions, {key: data[key].dtype for key in keys if key != "Month"}, *totals)
+
+    def map_ranges(self, fn, rows, *args):
+        # Runs fn(*args, start, stop) on one range of rows per worker and
+        # merges the partial totals.
+        bounds = np.linspace(0, rows, self.workers + 1).astype(int)
+        futures = [
+            self._pool().submit(fn, *args, int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+        ]
+        return merge_totals([future.result() for future in futures])
+
+
+def month_dimension(dates):
+    # ("Month", first month ordinal, number of months + 1) over datetime64
+    # or int32 day dates; the extra code is for missing dates.
+    if dates.dtype.kind == "M":
+        present = dates[~np.isnat(dates)]
+    else:
+        present = dates[dates != np.iinfo(dates.dtype).min].astype("datetime64[D]")
+    if not len(present):
+        return "Month", 0, 1
+    first, last = np.array([present.min(), present.max()]).astype("datetime64[M]").astype("int64")
+    return "Month", int(first), int(last - first + 2)
+
+
+def frame_totals(keys, dimensions, dtypes, group_keys, sums, counts):
+    # The Amount and Count frame _sum_by() returns, from merged totals;
+    # dtypes gives each categorical key's dtype.
+    codes = np.unravel_index(group_keys, [size for _, _, size in dimensions])
+    levels = {}
+    for (name, offset, size), level_codes in zip(dimensions, codes):
+        missing = level_codes == size - 1
+        if name == "Month":
+            ordinals = np.where(missing, np.iinfo("int64").min, level_codes + offset)
+            levels[name] = pd.PeriodIndex.from_ordinals(ordinals, freq="M")
+        else:
+            levels[name] = pd.Categorical.from_codes(np.where(missing, -1, level_codes), dtype=dtypes[name])
+    return pd.DataFrame({**levels, "Amount": sums / 100, "Count": counts}).set_index(keys)
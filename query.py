@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+from storage import to_cents
+
+
+RANGE_COLUMNS = ["Date", "Amount"]
+VALUE_COLUMNS = ["Category", "Spender", "Source"]
+INDEX_COLUMNS = RANGE_COLUMNS + VALUE_COLUMNS
+
+
+def _bound(column, value, upper=False):
+    # Dates match whole days, so an upper bound runs to the end of its day.
+    if column == "Date":
+        day = pd.Timestamp(value).normalize()
+        return (day + pd.Timedelta(days=1)).value - 1 if upper else day.value
+    return int(round(float(value) * 100))
+
+
+def _as_list(values):
+    return list(values) if isinstance(values, (list, tuple, set)) else [values]
+
+
+class LedgerIndex:
+    # Secondary indexes for filtered queries, kept in step with the ledger
+    # through model mutation events:
+    #   Date and Amount (in cents) - sorted, with each entry's row id, so a
+    #     range is two binary searches
+    #   Category, Spender, Source - the sorted row ids holding each value
+    # Every indexed column is also kept by row id. select() starts from the
+    # condition with the fewest candidate rows and checks the others row by
+    # row, so it costs about the size of that candidate set, not the ledger.
+    def __init__(self):
+        self._by_row = None
+
+    def is_built(self):
+        return self._by_row is not None
+
+    def invalidate(self):
+        self._by_row = None
+        self._sorted = None
+        self._codes = None
+        self._postings = None
+
+    def build(self, rows):
+        self._present = np.zeros(0, dtype=bool)
+        self._by_row = {column: np.zeros(0, dtype="int64") for column in RANGE_COLUMNS}
+        self._by_row.update({column: np.zeros(0, dtype="int32") for column in VALUE_COLUMNS})
+        self._sorted = {column: (np.zeros(0, dtype="int64"), np.zeros(0, dtype="int64")) for column in RANGE_COLUMNS}
+        self._codes = {column: {} for column in VALUE_COLUMNS}
+        self._postings = {column: {} for column in VALUE_COLUMNS}
+        self._insert(rows)
+
+    def _grow(self, size):
+        if size <= len(self._present):
+            return
+        extra = size - len(self._present)
+        self._present = np.concatenate([self._present, np.zeros(extra, dtype=bool)])
+        for column, values in self._by_row.items():
+            fill = -1 if column in VALUE_COLUMNS else 0
+            self._by_row[column] = np.concatenate([values, np.full(extra, fill, dtype=values.dtype)])
+
+    def _value_codes(self, column, values):
+        # Codes in this index's own dictionary (the ledger's categories
+        # change as rows come and go); missing values are -1.
+        values = values.astype("category") if not isinstance(values.dtype, pd.CategoricalDtype) else values
+        codes = self._codes[column]
+        lookup = np.array([codes.setdefault(value, len(codes)) for value in values.cat.categories] + [-1], dtype="int32")
+        return lookup[values.cat.codes.to_numpy()]
+
+    def _insert(self, rows):
+        if rows is None or rows.empty:
+            return
+        row_ids = rows.index.to_numpy(dtype="int64")
+        self._grow(int(row_ids.max()) + 1)
+        self._present[row_ids] = True
+        columns = {
+            "Date": rows["Date"].to_numpy(dtype="datetime64[ns]").view("int64"),
+            "Amount": to_cents(rows["Amount"]).to_numpy(),
+        }
+        for column in RANGE_COLUMNS:
+            values = columns[column]
+            self._by_row[column][row_ids] = values
+            order = np.argsort(values, kind="stable")
+            sorted_values, sorted_ids = self._sorted[column]
+            positions = np.searchsorted(sorted_values, values[order], side="right")
+            self._sorted[column] = (
+                np.insert(sorted_values, positions, values[order]), np.insert(sorted_ids, positions, row_ids[order])
+            )
+        for column in VALUE_COLUMNS:
+            codes = self._value_codes(column, rows[column])
+            self._by_row[column][row_ids] = codes
+            order = np.argsort(codes, kind="stable")
+            codes, ids = codes[order], row_ids[order]
+            starts = np.flatnonzero(np.diff(codes, prepend=-2))
+            for start, end in zip(starts, np.append(starts[1:], len(codes))):
+                if codes[start] < 0:
+                    continue
+                new = np.sort(ids[start:end])
+                posting = self._postings[column].get(int(codes[start]))
+                self._postings[column][int(codes[start])] = (
+                    new if posting is None else np.insert(posting, np.searchsorted(posting, new), new)
+                )
+
+    def _remove(self, row_ids):
+        row_ids = np.asarray(row_ids, dtype="int64")
+        row_ids = row_ids[(row_ids < len(self._present))]
+        row_ids = row_ids[self._present[row_ids]]
+        if not len(row_ids):
+            return
+        self._present[row_ids] = False
+        for column in RANGE_COLUMNS:
+            sorted_values, sorted_ids = self._sorted[column]
+            keep = ~np.isin(sorted_ids, row_ids)
+            self._sorted[column] = sorted_values[keep], sorted_ids[keep]
+        for column in VALUE_COLUMNS:
+            codes = self._by_row[column][row_ids]
+            for code in np.unique(codes[codes >= 0]):
+                posting = self._postings[column][int(code)]
+                self._postings[column][int(code)] = posting[~np.isin(posting, row_ids[codes == code])]
+            self._by_row[column][row_ids] = -1
+
+    def on_ledger_changed(self, event, before, after):
+        if event in ("reset", "reindex"):
+            self.invalidate()
+        elif self.is_built():
+            if before is not None:
+                self._remove(before.index)
+            self._insert(after)
+
+    def _range(self, column, low, high):
+        # (candidate count, candidates, check) for low <= column <= high.
+        sorted_values, sorted_ids = self._sorted[column]
+        low = None if low is None else _bound(column, low)
+        high = None if high is None else _bound(column, high, upper=True)
+        first = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        last = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side="right")
+
+        def check(row_ids):
+            values = self._by_row[column][row_ids]
+            mask = np.ones(len(row_ids), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return mask
+
+        return max(0, last - first), lambda: sorted_ids[first:last], check
+
+    def _values(self, column, values):
+        codes = [self._codes[column][value] for value in _as_list(values) if value in self._codes[column]]
+        postings = [self._postings[column].get(code, np.zeros(0, dtype="int64")) for code in codes]
+        return (
+            sum(len(posting) for posting in postings),
+            lambda: np.concatenate(postings) if postings else np.zeros(0, dtype="int64"),
+            lambda row_ids: np.isin(self._by_row[column][row_ids], codes),
+        )
+
+    def select(self, start=None, end=None, min_amount=None, max_amount=None, category=None, spender=None, source=None):
+        # Sorted row ids of the rows matching every given condition; see
+        # SpendTrackerModel.query_row_ids().
+        conditions = []
+        if start is not None or end is not None:
+            conditions.append(self._range("Date", start, end))
+        if min_amount is not None or max_amount is not None:
+            conditions.append(self._range("Amount", min_amount, max_amount))
+        for column, values in (("Category", category), ("Spender", spender), ("Source", source)):
+            if values is not None:
+                conditions.append(self._values(column, values))
+        if not conditions:
+            return np.flatnonzero(self._present)
+
+        conditions.sort(key=lambda condition: condition[0])
+        row_ids = conditions[0][1]()
+        for _, _, check in conditions[1:]:
+            row_ids = row_ids[check(row_ids)]
+        return np.sort(row_ids)
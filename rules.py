@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+RULE_FIELDS = ["Description", "Source"]
+RULE_TARGETS = ["Category", "Spender"]
+
+
+def make_rule(pattern, category=None, spender=None, field="Description", regex=False, override=False):
+    pattern = pattern.strip()
+    if not pattern:
+        raise ValueError("Rule pattern cannot be empty.")
+    if field not in RULE_FIELDS:
+        raise ValueError(f"Rules match on {' or '.join(RULE_FIELDS)}, not {field}.")
+    if not category and not spender:
+        raise ValueError("A rule has to set a category, a spender or both.")
+    if regex:
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern {pattern!r}: {e}")
+    return {
+        "pattern": pattern, "field": field, "regex": bool(regex), "category": category or None,
+        "spender": spender or None, "override": bool(override), "hits": 0, "last_hit": None,
+    }
+
+
+class RuleSet:
+    # Categorization rules, kept in priority order in category_rules.json:
+    # the first rule whose pattern is in a row's Description (or Source)
+    # sets its Category and/or Spender. Patterns are case-insensitive
+    # substrings, or regular expressions with "regex": true. Rules fill in
+    # blank values; with "override": true they replace what the statement
+    # says. "hits" counts the rows each rule has categorized.
+    #
+    # Rules are matched against a chunk's distinct values and map to rows by
+    # their codes. For literal rules the values are joined into one
+    # lower-cased text, one value per line, and each rule is a single
+    # C-level scan over it; the match offsets map back to values by binary
+    # search. (Python's re has no multi-pattern optimization, so one
+    # alternation of every rule runs a lot slower than this.) Regular
+    # expressions can match across the line breaks, so they are searched
+    # value by value.
+    def __init__(self, path="category_rules.json"):
+        self.path = path
+        self._lock = threading.RLock()
+        self.rules = self._load()
+        self._matchers = None
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                return json.load(file)
+        return []
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as file:
+                json.dump(self.rules, file, indent=4)
+
+    def add(self, rule, position=None):
+        # A rule for the same pattern on the same field replaces it.
+        with self._lock:
+            self.rules = [
+                existing for existing in self.rules
+                if (existing["pattern"], existing["field"]) != (rule["pattern"], rule["field"])
+            ]
+            self.rules.insert(len(self.rules) if position is None else position, rule)
+            self._matchers = None
+            self.save()
+
+    def remove(self, position):
+        with self._lock:
+            del self.rules[position]
+            self._matchers = None
+            self.save()
+
+    def frame(self):
+        with self._lock:
+            columns = ["pattern", "field", "regex", "category", "spender", "override", "hits", "last_hit"]
+            return pd.DataFrame(self.rules, columns=columns)
+
+    @staticmethod
+    def _compile(rule):
+        # The text is lower-cased already; leaving IGNORECASE off literals
+        # keeps re on its fast substring search.
+        if not rule["regex"]:
+            return re.compile(re.escape(rule["pattern"].lower()))
+        return re.compile(rule["pattern"], re.IGNORECASE)
+
+    def _value_rules(self, field, values):
+        # {rule number: positions in values.cat.categories of the values
+        # the rule matches} for the rules on field.
+        categories = [str(value) for value in values.cat.categories]
+        text = None
+        matched = {}
+        for number, rule in enumerate(self.rules):
+            if rule["field"] != field:
+                continue
+            if rule["regex"]:
+                search = self._matchers[number].search
+                found = np.array([position for position, value in enumerate(categories) if search(value)], dtype="int64")
+                if len(found):
+                    matched[number] = found
+                continue
+            if text is None:
+                lines = [value.replace("\n", " ") for value in categories]
+                text = "\n".join(lines).lower()
+                starts = np.cumsum([0] + [len(value) + 1 for value in lines[:-1]])
+            spans = np.array([match.span() for match in self._matchers[number].finditer(text)], dtype="int64")
+            if not len(spans):
+                continue
+            first = np.searchsorted(starts, spans[:, 0], side="right") - 1
+            last = np.searchsorted(starts, np.maximum(spans[:, 1] - 1, spans[:, 0]), side="right") - 1
+            matched[number] = np.unique(first[first == last])
+        return matched
+
+    def apply(self, rows):
+        # Returns rows with their rule categories and spenders set, and
+        # adds to the rules' hit counts.
+        with self._lock:
+            if not self.rules or rows is None or rows.empty:
+                return rows
+            if self._matchers is None:
+                self._matchers = [self._compile(rule) for rule in self.rules]
+            none = len(self.rules)
+            fields = {}
+            for field in RULE_FIELDS:
+                values = rows[field]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    # A slice of a larger frame keeps all of its categories.
+                    values = values.cat.remove_unused_categories()
+                else:
+                    values = values.astype("category")
+                if values.cat.categories.size:
+                    fields[field] = (values.cat.codes.to_numpy(), len(values.cat.categories), self._value_rules(field, values))
+            hits = []
+            for target in RULE_TARGETS:
+                # Number of the first rule setting target that matches each
+                # row, none where no rule does.
+                first = np.full(len(rows), none, dtype="int64")
+                for codes, size, matched in fields.values():
+                    value_first = np.full(size + 1, none, dtype="int64")
+                    for number in sorted(matched, reverse=True):
+                        if self.rules[number].get(target.lower()):
+                            value_first[matched[number]] = number
+                    first = np.minimum(first, value_first[codes])
+                if (first == none).all():
+                    continue
+                override = np.array([rule["override"] for rule in self.rules] + [False])[first]
+                blank = (rows[target].isna() | (rows[target].astype(object) == "")).to_numpy()
+                applied = (first < none) & (override | blank)
+                values = rows[target].astype(object).to_numpy(copy=True)
+                values[applied] = np.array([rule.get(target.lower()) for rule in self.rules] + [None], dtype=object)[
+                    first[applied]
+                ]
+                rows = rows.assign(**{target: pd.Series(values, index=rows.index).astype("category")})
+                hits.append(np.flatnonzero(applied) * (none + 1) + first[applied])
+
+            if hits:
+                # A row categorized and assigned a spender by one rule is
+                # one hit.
+                counts = np.bincount(np.unique(np.concatenate(hits)) % (none + 1), minlength=none)
+                today = date.today().isoformat()
+                for rule, count in zip(self.rules, counts):
+                    if count:
+                        rule["hits"] = rule.get("hits", 0) + int(count)
+                        rule["last_hit"] = today
+                if counts.any():
+                    self.save()
+            return rows
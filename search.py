@@ -0,0 +1,159 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+TOKEN = re.compile(r"\w+")
+QUERY_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def parse_query(text):
+    # [(tokens, is_phrase)]: "quoted words" are a phrase, matched as
+    # consecutive whole words; other words match as word prefixes, so
+    # "coff" finds "Coffee". Every term has to match.
+    terms = []
+    for phrase, word in QUERY_TERM.findall(text):
+        tokens = tokenize(phrase if phrase else word)
+        if len(tokens) > 1 or (phrase and tokens):
+            terms.append((tokens, True))
+        elif tokens:
+            terms.append((tokens, False))
+    return terms
+
+
+class DescriptionIndex:
+    # Full-text index over Description, kept in step with the ledger through
+    # model mutation events. Statements repeat the same descriptions a lot,
+    # so words are indexed per distinct description:
+    #   word -> ids of the descriptions containing it (words also kept
+    #     sorted, so a prefix is a binary search)
+    #   description id -> its words, in order, to check phrases
+    # and rows are kept sorted by description id with their row ids, so the
+    # rows of a set of descriptions are one binary search each.
+    def __init__(self):
+        self._ids = None
+
+    def is_built(self):
+        return self._ids is not None
+
+    def invalidate(self):
+        self._ids = None
+        self._tokens = None
+        self._words = None
+        self._sorted_words = None
+        self._sorted = None
+        self._by_row = None
+
+    def build(self, rows):
+        self._ids = {}
+        self._tokens = []
+        self._words = {}
+        self._sorted_words = []
+        self._sorted = (np.zeros(0, dtype="int32"), np.zeros(0, dtype="int64"))
+        self._by_row = np.zeros(0, dtype="int32")
+        self._insert(rows)
+
+    def _description_ids(self, values):
+        # Ids in this index's own dictionary; missing values are -1.
+        values = values.astype("category") if not isinstance(values.dtype, pd.CategoricalDtype) else values
+        new_words = False
+        lookup = []
+        for text in values.cat.categories:
+            number = self._ids.get(text)
+            if number is None:
+                number = self._ids[text] = len(self._tokens)
+                tokens = tokenize(str(text))
+                self._tokens.append(tokens)
+                for token in set(tokens):
+                    new_words |= token not in self._words
+                    self._words.setdefault(token, set()).add(number)
+            lookup.append(number)
+        if new_words:
+            self._sorted_words = sorted(self._words)
+        return np.array(lookup + [-1], dtype="int32")[values.cat.codes.to_numpy()]
+
+    def _insert(self, rows):
+        if rows is None or rows.empty:
+            return
+        row_ids = rows.index.to_numpy(dtype="int64")
+        numbers = self._description_ids(rows["Description"])
+        if int(row_ids.max()) >= len(self._by_row):
+            extra = int(row_ids.max()) + 1 - len(self._by_row)
+            self._by_row = np.concatenate([self._by_row, np.full(extra, -1, dtype="int32")])
+        self._by_row[row_ids] = numbers
+        keep = numbers >= 0
+        numbers, row_ids = numbers[keep], row_ids[keep]
+        order = np.lexsort((row_ids, numbers))
+        sorted_numbers, sorted_ids = self._sorted
+        positions = np.searchsorted(sorted_numbers, numbers[order], side="right")
+        self._sorted = (
+            np.insert(sorted_numbers, positions, numbers[order]), np.insert(sorted_ids, positions, row_ids[order])
+        )
+
+    def _remove(self, row_ids):
+        row_ids = np.asarray(row_ids, dtype="int64")
+        row_ids = row_ids[row_ids < len(self._by_row)]
+        row_ids = row_ids[self._by_row[row_ids] >= 0]
+        if not len(row_ids):
+            return
+        self._by_row[row_ids] = -1
+        sorted_numbers, sorted_ids = self._sorted
+        keep = ~np.isin(sorted_ids, row_ids)
+        self._sorted = sorted_numbers[keep], sorted_ids[keep]
+
+    def on_ledger_changed(self, event, before, after):
+        if event in ("reset", "reindex"):
+            self.invalidate()
+        elif self.is_built():
+            if before is not None:
+                self._remove(before.index)
+            self._insert(after)
+
+    def _prefix(self, prefix):
+        matches = set()
+        position = bisect_left(self._sorted_words, prefix)
+        while position < len(self._sorted_words) and self._sorted_words[position].startswith(prefix):
+            matches |= self._words[self._sorted_words[position]]
+            position += 1
+        return matches
+
+    def _phrase(self, tokens):
+        candidates = set.intersection(*(self._words.get(token, set()) for token in tokens))
+        size = len(tokens)
+        return {
+            number for number in candidates
+            if any(self._tokens[number][start:start + size] == tokens
+                   for start in range(len(self._tokens[number]) - size + 1))
+        }
+
+    def descriptions(self, text):
+        # Ids of the descriptions matching the query text, or None when the
+        # text has no words in it.
+        terms = parse_query(text)
+        if not terms:
+            return None
+        matches = None
+        for tokens, is_phrase in sorted(terms, key=lambda term: not term[1]):
+            found = self._phrase(tokens) if is_phrase else self._prefix(tokens[0])
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return matches
+
+    def search(self, text):
+        # Sorted row ids of the rows whose description matches the query
+        # text; see parse_query(). Text without words matches every row.
+        matches = self.descriptions(text)
+        if matches is None:
+            return np.flatnonzero(self._by_row >= 0)
+        sorted_numbers, sorted_ids = self._sorted
+        numbers = np.fromiter(matches, dtype="int32", count=len(matches))
+        starts = np.searchsorted(sorted_numbers, numbers, side="left")
+        lengths = np.searchsorted(sorted_numbers, numbers, side="right") - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.sort(sorted_ids[positions])
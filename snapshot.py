@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from parallel import frame_totals, keys_and_cents, month_dimension, partial_totals
+from storage import CATEGORICAL_COLUMNS, to_cents
+
+# Read-only ledger snapshots for analytics: one fixed-width little-endian
+# file per column, opened with np.memmap, so any number of readers (the
+# app, the report CLI, worker processes) share the same pages through the
+# OS cache, and opening one costs a few small file reads at any size.
+#
+#   spend_data.snapshot/CURRENT          name of the live version
+#   spend_data.snapshot/<version>/
+#       meta.json                        rows, token, column dtypes, first
+#                                        and last day
+#       RowId.bin      int64 row ids
+#       Date.bin       int32 days since 1970-01-01 (int32 min for missing)
+#       Cents.bin      int64 amounts in cents
+#       <Column>.bin   int32 category codes (-1 for missing), for Source,
+#                      Description, Category and Spender, with the
+#                      categories in <Column>.json
+#
+# A version is written in full under a temporary name and then renamed,
+# and CURRENT is replaced atomically, so readers never see half of one.
+
+SNAPSHOT_COLUMNS = {"RowId": "<i8", "Date": "<i4", "Cents": "<i8", **{column: "<i4" for column in CATEGORICAL_COLUMNS}}
+MISSING_DAY = np.iinfo("int32").min
+
+
+def _versions(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("v") and name[1:].isdigit())
+
+
+def write_snapshot(data, directory, token):
+    # token identifies the ledger state data came from; see open_snapshot().
+    os.makedirs(directory, exist_ok=True)
+    versions = _versions(directory)
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1:08d}"
+    temp_path = os.path.join(directory, version + ".tmp")
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    dates = data["Date"].to_numpy(dtype="datetime64[ns]")
+    days = dates.astype("datetime64[D]").astype("int64")
+    arrays = {
+        "RowId": data.index.to_numpy(dtype="int64"),
+        "Date": np.where(np.isnat(dates), MISSING_DAY, days),
+        "Cents": to_cents(data["Amount"]).to_numpy(),
+    }
+    for column in CATEGORICAL_COLUMNS:
+        values = data[column]
+        values = values.astype("category") if not isinstance(values.dtype, pd.CategoricalDtype) else values
+        arrays[column] = values.cat.codes.to_numpy()
+        with open(os.path.join(temp_path, f"{column}.json"), "w") as file:
+            json.dump([str(value) for value in values.cat.categories], file)
+    for column, dtype in SNAPSHOT_COLUMNS.items():
+        arrays[column].astype(dtype).tofile(os.path.join(temp_path, f"{column}.bin"))
+    present = arrays["Date"][arrays["Date"] != MISSING_DAY]
+    meta = {
+        "rows": len(data), "token": json.dumps(token), "columns": SNAPSHOT_COLUMNS,
+        "days": [int(present.min()), int(present.max())] if len(present) else [],
+    }
+    with open(os.path.join(temp_path, "meta.json"), "w") as file:
+        json.dump(meta, file)
+    os.replace(temp_path, os.path.join(directory, version))
+
+    current = os.path.join(directory, "CURRENT")
+    with open(current + ".tmp", "w") as file:
+        file.write(version)
+    os.replace(current + ".tmp", current)
+
+    # Keep the previous version for readers that just opened it; older
+    # ones go, unless a reader still has them mapped (Windows won't allow).
+    for name in versions[:-1]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return version
+
+
+def open_snapshot(directory, token=None):
+    # The live snapshot, or None if there isn't one or, given a token, if
+    # it was written from a different ledger state.
+    try:
+        with open(os.path.join(directory, "CURRENT")) as file:
+            snapshot = LedgerSnapshot(os.path.join(directory, file.read().strip()))
+    except (OSError, ValueError, KeyError):
+        return None
+    if token is not None and snapshot.token != json.dumps(token):
+        return None
+    return snapshot
+
+
+def snapshot_range_totals(path, keys, dimensions, days, start, stop):
+    # Runs in a worker: partial totals over rows start:stop of a snapshot.
+    snapshot = LedgerSnapshot(path)
+    names = ["Date", "Cents"] + [key for key in keys if key != "Month"]
+    arrays = {name: snapshot.column(name)[start:stop] for name in names}
+    return partial_totals(*keys_and_cents(arrays, dimensions, days), dimensions)
+
+
+class LedgerSnapshot:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        self.path = path
+        self.rows = meta["rows"]
+        self.token = meta["token"]
+        self._dtypes = meta["columns"]
+        self._days = np.array(meta["days"], dtype="int32")
+        self._columns = {}
+        self._categories = {}
+
+    def column(self, name):
+        # Read-only, memory-mapped; nothing is read until it is used.
+        if name not in self._columns:
+            if self.rows:
+                self._columns[name] = np.memmap(
+                    os.path.join(self.path, f"{name}.bin"), dtype=self._dtypes[name], mode="r", shape=(self.rows,)
+                )
+            else:
+                self._columns[name] = np.zeros(0, dtype=self._dtypes[name])
+        return self._columns[name]
+
+    def categories(self, name):
+        if name not in self._categories:
+            with open(os.path.join(self.path, f"{name}.json")) as file:
+                self._categories[name] = json.load(file)
+        return self._categories[name]
+
+    def group_totals(self, keys, month=None, parallel=None):
+        # Amount and Count by keys (Month and categorical columns), like the
+        # stores' group_totals(), straight from the mapped columns; None
+        # for keys it can't total. parallel, if given, is a
+        # ParallelAggregator to spread whole-ledger totals over.
+        if not keys or not all(key == "Month" or key in CATEGORICAL_COLUMNS for key in keys):
+            return None
+        days = None
+        if month is not None:
+            days = tuple(
+                int(np.datetime64(day.date(), "D").astype("int64")) for day in (month.start_time, month.end_time)
+            )
+        dimensions = []
+        for key in keys:
+            if key == "Month":
+                dimensions.append(month_dimension(self._days))
+            else:
+                dimensions.append((key, 0, len(self.categories(key)) + 1))
+
+        if parallel is not None and days is None:
+            totals = parallel.map_ranges(snapshot_range_totals, self.rows, self.path, keys, dimensions, days)
+        else:
+            arrays = {name: self.column(name) for name in ["Date", "Cents"] + [key for key in keys if key != "Month"]}
+            totals = partial_totals(*keys_and_cents(arrays, dimensions, days), dimensions)
+        dtypes = {key: pd.CategoricalDtype(self.categories(key)) for key in keys if key != "Month"}
+        return frame_totals(keys, dimensions, dtypes, *totals)
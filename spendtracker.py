@@ -0,0 +1,200 @@
+import time
+
+started = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from forecast import METHODS
+from metrics import format_summary, registry
+from model import SpendTrackerModel
+from storage import CsvSpendStore, ParquetSpendStore, PartitionedSpendStore, SqliteSpendStore
+
+imported = time.perf_counter()
+
+# Headless entry point for scheduled reports:
+#   python -m spendtracker report [REPORT ...] [--format csv|json] [--output PATH]
+#   python -m spendtracker freeze YYYY-MM
+#   python -m spendtracker metrics PATH
+# Only the model is used, so neither PyQt5 nor matplotlib is imported.
+
+STORES = {
+    "csv": CsvSpendStore, "parquet": ParquetSpendStore, "partitioned": PartitionedSpendStore, "sqlite": SqliteSpendStore,
+}
+
+
+def _month_table(frame):
+    frame = frame.round(2)
+    frame.index = frame.index.astype(str)
+    frame.index.name = "Month"
+    return frame
+
+
+def _records(mapping, key):
+    # {name: {field: value}} -> one CSV row per name.
+    frame = pd.DataFrame.from_dict(mapping, orient="index")
+    frame.index.name = key
+    return frame
+
+
+def _forecast(model, args):
+    forecast = model.forecast_expenses(args.months_ahead, args.method) or {}
+    frame = pd.Series(forecast, dtype="float64", name="Forecast").round(2).to_frame()
+    frame.index.name = "Month"
+    return frame
+
+
+def _series_forecast(model, by, args):
+    result = model.forecast_series(by, args.months_ahead, args.method)
+    if result is None:
+        return pd.DataFrame(index=pd.Index([], name="Month"))
+    return _month_table(result[1])
+
+
+REPORTS = {
+    "monthly-category": lambda model, args: _month_table(model.calculate_monthly_category_expenses()),
+    "monthly-spender": lambda model, args: _month_table(model.calculate_monthly_spender_expenses()),
+    "monthly-card": lambda model, args: _month_table(model.calculate_monthly_card_expenses()),
+    "credit-summary": lambda model, args: _records(model.calculate_credit_summary(), "Card"),
+    "budget-usage": lambda model, args: _records(model.calculate_budget_usage(), "Category"),
+    "forecast": _forecast,
+    "forecast-category": lambda model, args: _series_forecast(model, "Category", args),
+    "forecast-spender": lambda model, args: _series_forecast(model, "Spender", args),
+    "forecast-card": lambda model, args: _series_forecast(model, "Source", args),
+}
+
+
+def _to_json(frame):
+    return json.loads(frame.to_json(orient="index", double_precision=2))
+
+
+def write_reports(results, output_format, output):
+    if output_format == "json":
+        payload = json.dumps({name: _to_json(frame) for name, frame in results.items()}, indent=2)
+        if output in (None, "-"):
+            sys.stdout.write(payload + "\n")
+        else:
+            with open(output, "w") as file:
+                file.write(payload + "\n")
+        return
+
+    if output in (None, "-"):
+        (frame,) = results.values()
+        frame.to_csv(sys.stdout)
+        return
+    # One CSV per report in the output directory.
+    os.makedirs(output, exist_ok=True)
+    for name, frame in results.items():
+        frame.to_csv(os.path.join(output, f"{name}.csv"))
+
+
+def report(args):
+    timings = {"import": imported - started}
+
+    mark = time.perf_counter()
+    model = SpendTrackerModel(STORES[args.store]() if args.store else None)
+    if args.workers is not None:
+        model.parallel.set_workers(args.workers)
+    timings["open"] = time.perf_counter() - mark
+
+    results = {}
+    for name in args.reports or list(REPORTS):
+        mark = time.perf_counter()
+        results[name] = REPORTS[name](model, args)
+        timings[name] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    write_reports(results, args.format, args.output)
+    timings["write"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - started
+
+    if args.timing:
+        for name, seconds in timings.items():
+            print(f"{name:>16}: {seconds * 1000:8.1f} ms", file=sys.stderr)
+    if args.metrics:
+        print(format_summary(registry.summary()), file=sys.stderr)
+
+
+def freeze(args):
+    # Closes the books on old months of a partitioned ledger.
+    store = PartitionedSpendStore()
+    if not store.exists():
+        sys.exit(f"no partitioned ledger in {os.getcwd()}")
+    frozen = store.freeze(args.through)
+    print(f"froze {len(frozen)} months" + (f": {frozen[0]} to {frozen[-1]}" if frozen else ""))
+
+
+def snapshot(args):
+    # Writes the memory-mapped snapshot that reports (and the app) then
+    # total from; the app keeps it current from then on.
+    model = SpendTrackerModel(STORES[args.store]() if args.store else None)
+    mark = time.perf_counter()
+    # Against the files as close() leaves them, so the next session finds
+    # it current.
+    model.close()
+    written = model.write_snapshot()
+    print(f"wrote a {written.rows}-row snapshot to {model.snapshot_dir} in {time.perf_counter() - mark:.2f}s")
+
+
+def metrics(args):
+    # Prints a dump written by a session run with SPENDTRACKER_METRICS set.
+    with open(args.path) as file:
+        print(format_summary(json.load(file)))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="spendtracker", description="Monthly Spend Tracker reports without the GUI.")
+    parser.add_argument("--data-dir", help="directory holding the ledger and limit files (default: current directory)")
+    parser.add_argument("--store", choices=sorted(STORES), help="storage backend (default: $SPENDTRACKER_STORE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = commands.add_parser("report", help="print or write summary reports")
+    report_parser.add_argument("reports", nargs="*", metavar="REPORT",
+                               help=f"reports to produce (default: all of {', '.join(REPORTS)})")
+    report_parser.add_argument("--format", choices=["csv", "json"], default="json")
+    report_parser.add_argument("--output", help="JSON file, or directory for CSV files (default: stdout)")
+    report_parser.add_argument("--months-ahead", type=int, default=3, help="forecast horizon in months")
+    report_parser.add_argument("--method", choices=list(METHODS) + ["auto"], default="linear",
+                               help="forecast model; auto backtests each and keeps the best per series")
+    report_parser.add_argument("--workers", type=int,
+                               help="processes for totals over large ledgers (default: $SPENDTRACKER_WORKERS)")
+    report_parser.add_argument("--timing", action="store_true", help="print startup and per-report timings to stderr")
+    report_parser.add_argument("--metrics", action="store_true",
+                               help="print per-operation latencies, rows and bytes to stderr")
+    report_parser.set_defaults(run=report)
+
+    freeze_parser = commands.add_parser("freeze", help="make months of a partitioned ledger read-only")
+    freeze_parser.add_argument("through", help="last month to freeze, as YYYY-MM")
+    freeze_parser.set_defaults(run=freeze)
+
+    snapshot_parser = commands.add_parser("snapshot", help="write a read-only snapshot for fast reports")
+    snapshot_parser.set_defaults(run=snapshot)
+
+    metrics_parser = commands.add_parser("metrics", help="print a metrics dump from SPENDTRACKER_METRICS")
+    metrics_parser.add_argument("path")
+    metrics_parser.set_defaults(run=metrics)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = [name for name in getattr(args, "reports", []) if name not in REPORTS]
+    if unknown:
+        parser.error(f"unknown report: {', '.join(unknown)} (choose from {', '.join(REPORTS)})")
+    if args.command == "report" and args.format == "csv" and args.output in (None, "-") \
+            and len(args.reports) != 1:
+        parser.error("CSV output to stdout takes exactly one report; use --output DIR for several")
+    if args.command == "metrics":
+        args.path = os.path.abspath(args.path)
+    if args.data_dir:
+        os.chdir(args.data_dir)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,689 @@
+import copy
+import glob
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from metrics import instrumented, result_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+COLUMNS = ["Date", "Source", "Description", "Category", "Spender", "Amount"]
+# Dictionary-encoded in memory: a few bytes of codes per row, with each
+# distinct string held once.
+CATEGORICAL_COLUMNS = ["Source", "Description", "Category", "Spender"]
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def normalize(frame, columns=None):
+    columns = columns or COLUMNS
+    frame = frame.reindex(columns=columns)
+    if "Date" in columns:
+        frame["Date"] = pd.to_datetime(frame["Date"]).astype("datetime64[ns]")
+    for column in CATEGORICAL_COLUMNS:
+        if column in columns and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype("category")
+    if "Amount" in columns:
+        frame["Amount"] = pd.to_numeric(frame["Amount"]).astype("float64")
+    return frame
+
+
+def to_cents(amounts):
+    # Amounts as int64 cents. Totals are summed in cents, so they are exact
+    # however many rows go into them, and only divided back at the end.
+    return (amounts * 100).round().astype("int64")
+
+
+def coerce_value(column, value):
+    if column == "Amount":
+        return float(value)
+    if column == "Date":
+        date = pd.Timestamp(value)
+        if date is pd.NaT:
+            raise ValueError(f"Invalid date: {value!r}")
+        return date
+    return str(value)
+
+
+def concat_ledgers(frames):
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    # Concatenating categoricals with different categories falls back to
+    # object dtype, so union the categories first.
+    for column in CATEGORICAL_COLUMNS:
+        if column in frames[0].columns:
+            union = pd.api.types.union_categoricals([frame[column] for frame in frames])
+            categories = union.categories
+            frames = [
+                frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                for frame in frames
+            ]
+    return pd.concat(frames)
+
+
+def append_durably(path, render):
+    # render(empty) returns the bytes to append; `empty` tells it whether a
+    # header is needed.  Returns True when a torn tail had to be dropped.
+    repaired = False
+    with open(path, "a+b") as file:
+        size = file.seek(0, os.SEEK_END)
+        if size:
+            # A crash mid-append can leave a partial last line; drop it.
+            file.seek(max(0, size - 4096))
+            tail = file.read()
+            if not tail.endswith(b"\n"):
+                size -= len(tail) - (tail.rfind(b"\n") + 1)
+                file.truncate(size)
+                repaired = True
+        try:
+            file.write(render(not size))
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.truncate(size)
+            raise
+    return repaired
+
+
+def _fsync_replace(temp_path, path):
+    with open(temp_path, "rb+") as file:
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def _stat(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _stored_bytes(result, store, *args, **kwargs):
+    # Bytes read or written, taken as the store's size on disk.
+    return sum(stat[1] for stat in map(_stat, store.files()) if stat)
+
+
+def _frame_rows(result, store, frame):
+    return len(frame)
+
+
+class CsvSpendStore:
+    supports_updates = False
+
+    def __init__(self, path="spend_data.csv"):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def signature(self):
+        return _stat(self.path)
+
+    def files(self):
+        return [self.path]
+
+    @instrumented("store.csv.read", rows=result_rows, size=_stored_bytes)
+    def read(self, columns=None):
+        dtypes = {column: "category" for column in CATEGORICAL_COLUMNS}
+        dtypes["Amount"] = "float64"
+        data = pd.read_csv(
+            self.path,
+            usecols=columns,
+            dtype={column: dtype for column, dtype in dtypes.items() if not columns or column in columns},
+            parse_dates=["Date"] if not columns or "Date" in columns else False,
+        )
+        return normalize(data, columns)
+
+    @instrumented("store.csv.append", rows=_frame_rows)
+    def append(self, frame):
+        # Returns True when the file needed repair; the caller must re-read.
+        return append_durably(
+            self.path,
+            lambda empty: frame.to_csv(index=False, header=empty, date_format=DATE_FORMAT).encode()
+        )
+
+    @instrumented("store.csv.write", rows=_frame_rows, size=_stored_bytes)
+    def write(self, frame):
+        temp_path = self.path + ".tmp"
+        frame.to_csv(temp_path, index=False, date_format=DATE_FORMAT)
+        _fsync_replace(temp_path, self.path)
+
+
+class ParquetSpendStore:
+    # Appends land in small numbered segment files next to the base file, so
+    # adding rows never rewrites the ledger. write() folds them back in.
+    segment_key = b"spendtracker.segment"
+    supports_updates = False
+
+    def __init__(self, path="spend_data.parquet"):
+        if pq is None:
+            raise ImportError("ParquetSpendStore requires pyarrow")
+        self.path = path
+        self._segment_prefix = os.path.splitext(path)[0] + ".segment-"
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _base_segment(self):
+        metadata = pq.read_schema(self.path).metadata or {}
+        return int(metadata.get(self.segment_key, b"0"))
+
+    def _segments(self):
+        base_segment = self._base_segment()
+        segments = []
+        for path in glob.glob(glob.escape(self._segment_prefix) + "*.parquet"):
+            number = int(path[len(self._segment_prefix):-len(".parquet")])
+            # Segments already folded into the base by an interrupted write().
+            if number > base_segment:
+                segments.append((number, path))
+        return sorted(segments)
+
+    def signature(self):
+        if not self.exists():
+            return None
+        return _stat(self.path), tuple(_stat(path) for _, path in self._segments())
+
+    def files(self):
+        return [self.path] + [path for _, path in self._segments()] if self.exists() else []
+
+    @instrumented("store.parquet.read", rows=result_rows, size=_stored_bytes)
+    def read(self, columns=None):
+        paths = [self.path] + [path for _, path in self._segments()]
+        frames = [normalize(pd.read_parquet(path, columns=columns), columns) for path in paths]
+        data = concat_ledgers(frames)
+        return frames[0] if data is None else data.reset_index(drop=True)
+
+    def _write_table(self, frame, path, segment):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[self.segment_key] = str(segment).encode()
+        temp_path = path + ".tmp"
+        pq.write_table(table.replace_schema_metadata(metadata), temp_path)
+        _fsync_replace(temp_path, path)
+
+    @instrumented("store.parquet.append", rows=_frame_rows)
+    def append(self, frame):
+        segments = self._segments()
+        number = max([self._base_segment()] + [number for number, _ in segments]) + 1
+        self._write_table(normalize(frame), f"{self._segment_prefix}{number:06d}.parquet", number)
+        return False
+
+    @instrumented("store.parquet.write", rows=_frame_rows, size=_stored_bytes)
+    def write(self, frame):
+        segments = self._segments() if self.exists() else []
+        last_segment = segments[-1][0] if segments else (self._base_segment() if self.exists() else 0)
+        self._write_table(normalize(frame), self.path, last_segment)
+        for path in glob.glob(glob.escape(self._segment_prefix) + "*.parquet"):
+            os.remove(path)
+
+
+class SqliteSpendStore:
+    # Row ids are the table's primary key, so edits and deletes are plain
+    # UPDATE/DELETE statements, and aggregations run as indexed GROUP BYs
+    # without loading the ledger into memory.
+    supports_updates = True
+
+    def __init__(self, path="spend_data.sqlite"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript("""
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS expenses (
+                    RowId INTEGER PRIMARY KEY,
+                    Date TEXT NOT NULL,
+                    Month TEXT NOT NULL,
+                    Source TEXT,
+                    Description TEXT,
+                    Category TEXT,
+                    Spender TEXT,
+                    Amount REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS expenses_month_category ON expenses (Month, Category);
+                CREATE INDEX IF NOT EXISTS expenses_month_spender ON expenses (Month, Spender);
+                CREATE INDEX IF NOT EXISTS expenses_month_source ON expenses (Month, Source);
+                CREATE INDEX IF NOT EXISTS expenses_date ON expenses (Date);
+            """)
+        return self._connection
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def signature(self):
+        # data_version only changes when another connection commits.
+        with self._lock:
+            return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def disk_signature(self):
+        # Unlike signature(), stable across sessions: committed data lives in
+        # the database file, or in the write-ahead log until a checkpoint.
+        wal = _stat(self.path + "-wal")
+        return _stat(self.path), wal if wal and wal[1] else None
+
+    def files(self):
+        return [self.path, self.path + "-wal"]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @instrumented("store.sqlite.read", rows=result_rows, size=_stored_bytes)
+    def read(self, columns=None):
+        columns = columns or COLUMNS
+        with self._lock:
+            data = pd.read_sql_query(
+                f"SELECT RowId, {', '.join(columns)} FROM expenses ORDER BY RowId",
+                self._connect(),
+                index_col="RowId",
+            )
+        data.index.name = None
+        return normalize(data, columns)
+
+    def next_row_id(self):
+        with self._lock:
+            return self._connect().execute("SELECT COALESCE(MAX(RowId), -1) + 1 FROM expenses").fetchone()[0]
+
+    def _records(self, frame):
+        frame = normalize(frame)
+        dates = frame["Date"]
+        return zip(
+            (int(row_id) for row_id in frame.index),
+            dates.dt.strftime(DATE_FORMAT),
+            dates.dt.strftime("%Y-%m"),
+            frame["Source"].astype(object),
+            frame["Description"].astype(object),
+            frame["Category"].astype(object),
+            frame["Spender"].astype(object),
+            frame["Amount"],
+        )
+
+    def _insert(self, connection, frame):
+        connection.executemany(
+            "INSERT INTO expenses (RowId, Date, Month, Source, Description, Category, Spender, Amount) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._records(frame),
+        )
+
+    @instrumented("store.sqlite.append", rows=_frame_rows)
+    def append(self, frame):
+        with self._lock, self._connect() as connection:
+            self._insert(connection, frame)
+        return False
+
+    @instrumented("store.sqlite.write", rows=_frame_rows, size=_stored_bytes)
+    def write(self, frame):
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM expenses")
+            self._insert(connection, frame)
+
+    def update_cell(self, row_id, column, value):
+        if column not in COLUMNS:
+            raise KeyError(column)
+        with self._lock, self._connect() as connection:
+            if column == "Date":
+                cursor = connection.execute(
+                    "UPDATE expenses SET Date = ?, Month = ? WHERE RowId = ?",
+                    (value.strftime(DATE_FORMAT), value.strftime("%Y-%m"), int(row_id)),
+                )
+            else:
+                cursor = connection.execute(
+                    f"UPDATE expenses SET {column} = ? WHERE RowId = ?", (value, int(row_id))
+                )
+            if not cursor.rowcount:
+                raise KeyError(row_id)
+
+    def delete_rows(self, row_ids):
+        with self._lock, self._connect() as connection:
+            connection.executemany("DELETE FROM expenses WHERE RowId = ?", [(int(row_id),) for row_id in row_ids])
+
+    def read_rows(self, row_ids):
+        placeholders = ", ".join("?" * len(row_ids))
+        with self._lock:
+            data = pd.read_sql_query(
+                f"SELECT RowId, {', '.join(COLUMNS)} FROM expenses WHERE RowId IN ({placeholders}) ORDER BY RowId",
+                self._connect(),
+                params=[int(row_id) for row_id in row_ids],
+                index_col="RowId",
+            )
+        data.index.name = None
+        return normalize(data)
+
+    @instrumented("store.sqlite.group_totals", rows=result_rows)
+    def group_totals(self, keys, month=None):
+        where, parameters = "", ()
+        if month is not None:
+            where, parameters = "WHERE Month = ?", (str(month),)
+        key_list = ", ".join(keys)
+        with self._lock:
+            self._connect()
+        # A connection of its own, so a long GROUP BY doesn't hold up writes
+        # and signature() checks on the shared one; WAL lets it read
+        # alongside them.
+        with closing(sqlite3.connect(self.path)) as connection:
+            result = pd.read_sql_query(
+                f"SELECT {key_list}, SUM(CAST(ROUND(Amount * 100) AS INTEGER)) AS Cents, COUNT(*) AS Count "
+                f"FROM expenses {where} "
+                f"GROUP BY {key_list} ORDER BY {key_list}",
+                connection,
+                params=parameters,
+            )
+        if "Month" in keys:
+            result["Month"] = pd.PeriodIndex(result["Month"], freq="M")
+        if "Date" in keys:
+            result["Date"] = pd.to_datetime(result["Date"])
+        result.insert(len(keys), "Amount", result.pop("Cents") / 100)
+        return result.set_index(keys)
+
+
+class PartitionedSpendStore:
+    # One Parquet partition per calendar month in a directory, listed in a
+    # manifest with each month's files, row count and row id range. Reads
+    # and totals scoped to a month only open that month's files; appends add
+    # a small file to each month they touch, and an edit or delete rewrites
+    # only its own month. Frozen months are read-only.
+    supports_updates = True
+    max_files = 8  # per month before appends are folded together
+
+    def __init__(self, path="spend_data.partitions"):
+        if pq is None:
+            raise ImportError("PartitionedSpendStore requires pyarrow")
+        self.path = path
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self._lock = threading.RLock()
+        self._manifest = None
+        self._manifest_stat = None
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def signature(self):
+        return _stat(self.manifest_path)
+
+    def files(self):
+        with self._lock:
+            partitions = self._load()["partitions"].values()
+            return [self.manifest_path] + [self._file(name) for partition in partitions for name in partition["files"]]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        # The manifest is re-read only when another process rewrote it.
+        stat = _stat(self.manifest_path)
+        if self._manifest is None or stat != self._manifest_stat:
+            if stat is None:
+                self._manifest = {"next_row_id": 0, "next_file": 0, "partitions": {}}
+            else:
+                with open(self.manifest_path) as file:
+                    self._manifest = json.load(file)
+            self._manifest_stat = stat
+        return self._manifest
+
+    def _save(self, manifest):
+        # Data files are written before the manifest that lists them, so a
+        # crash leaves either the old or the new month, never half of one.
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(manifest, file, indent=1)
+        _fsync_replace(temp_path, self.manifest_path)
+        self._manifest = manifest
+        self._manifest_stat = _stat(self.manifest_path)
+
+    def months(self):
+        return [pd.Period(month, freq="M") for month in sorted(self._load()["partitions"])]
+
+    def _write_file(self, manifest, month, frame):
+        os.makedirs(self.path, exist_ok=True)
+        name = f"{month}-{manifest['next_file']:06d}.parquet"
+        manifest["next_file"] += 1
+        table = pa.Table.from_pandas(frame.rename_axis("RowId").reset_index(), preserve_index=False)
+        temp_path = self._file(name) + ".tmp"
+        pq.write_table(table, temp_path)
+        _fsync_replace(temp_path, self._file(name))
+        return name
+
+    def _read_files(self, names, columns):
+        # One Arrow table for all the files, so pandas converts (and unifies
+        # the categories) once rather than per file.
+        if not names:
+            return None
+        tables = [pq.read_table(self._file(name), columns=["RowId"] + columns) for name in names]
+        frame = pa.concat_tables(tables, promote_options="permissive").to_pandas().set_index("RowId")
+        frame.index.name = None
+        return normalize(frame, columns)
+
+    def _read_partition(self, manifest, month, columns):
+        return self._read_files(manifest["partitions"][month]["files"], columns)
+
+    def _read(self, months, columns):
+        partitions = self._load()["partitions"]
+        data = self._read_files([name for month in months for name in partitions[month]["files"]], columns)
+        if data is None:
+            return normalize(pd.DataFrame(columns=columns), columns)
+        return data.sort_index()
+
+    @instrumented("store.partitioned.read", rows=result_rows, size=_stored_bytes)
+    def read(self, columns=None, months=None):
+        # months limits the read to those partitions (Periods or "YYYY-MM").
+        with self._lock:
+            partitions = self._load()["partitions"]
+            selected = sorted(partitions) if months is None else [str(month) for month in months if str(month) in partitions]
+            return self._read(selected, columns or COLUMNS)
+
+    def next_row_id(self):
+        with self._lock:
+            return self._load()["next_row_id"]
+
+    def _replace_month(self, manifest, month, frame):
+        # Points the manifest at a single new file holding frame; the old
+        # files are removed once the manifest is saved.
+        partition = manifest["partitions"][month]
+        stale = list(partition["files"])
+        if len(frame):
+            partition.update(
+                files=[self._write_file(manifest, month, frame)], rows=len(frame),
+                min_row=int(frame.index.min()), max_row=int(frame.index.max())
+            )
+        else:
+            del manifest["partitions"][month]
+        return stale
+
+    def _add_to_month(self, manifest, month, frame):
+        partition = manifest["partitions"].setdefault(
+            month, {"files": [], "rows": 0, "min_row": int(frame.index.min()), "max_row": int(frame.index.max()), "frozen": False}
+        )
+        if partition["frozen"]:
+            raise ValueError(f"{month} is frozen")
+        partition["files"].append(self._write_file(manifest, month, frame))
+        partition["rows"] += len(frame)
+        partition["min_row"] = min(partition["min_row"], int(frame.index.min()))
+        partition["max_row"] = max(partition["max_row"], int(frame.index.max()))
+        manifest["next_row_id"] = max(manifest["next_row_id"], int(frame.index.max()) + 1)
+        if len(partition["files"]) > self.max_files:
+            return self._replace_month(manifest, month, self._read_partition(manifest, month, COLUMNS))
+        return []
+
+    def _commit(self, manifest, stale):
+        self._save(manifest)
+        for name in stale:
+            os.remove(self._file(name))
+
+    def _by_month(self, frame):
+        months = frame["Date"].dt.to_period("M")
+        return {str(month): rows for month, rows in frame.groupby(months, sort=True)}
+
+    def _check_writable(self, manifest, months):
+        frozen = sorted(month for month in months if manifest["partitions"].get(month, {}).get("frozen"))
+        if frozen:
+            raise ValueError(f"{', '.join(frozen)} is frozen")
+
+    @instrumented("store.partitioned.append", rows=_frame_rows)
+    def append(self, frame):
+        frame = normalize(frame)
+        with self._lock:
+            manifest = copy.deepcopy(self._load())
+            parts = self._by_month(frame)
+            self._check_writable(manifest, parts)
+            stale = []
+            for month, rows in parts.items():
+                stale += self._add_to_month(manifest, month, rows)
+            self._commit(manifest, stale)
+        return False
+
+    @instrumented("store.partitioned.write", rows=_frame_rows, size=_stored_bytes)
+    def write(self, frame):
+        # Replaces the whole ledger, frozen months included; months that
+        # are still present stay frozen.
+        frame = normalize(frame)
+        with self._lock:
+            previous = self._load()
+            manifest = {"next_row_id": int(frame.index.max()) + 1 if len(frame) else 0,
+                        "next_file": previous["next_file"], "partitions": {}}
+            for month, rows in sorted(self._by_month(frame).items()):
+                manifest["partitions"][month] = {
+                    "files": [self._write_file(manifest, month, rows)], "rows": len(rows),
+                    "min_row": int(rows.index.min()), "max_row": int(rows.index.max()),
+                    "frozen": previous["partitions"].get(month, {}).get("frozen", False),
+                }
+            self._save(manifest)
+            # Also sweeps files orphaned by an interrupted write.
+            live = {name for partition in manifest["partitions"].values() for name in partition["files"]}
+            for path in glob.glob(os.path.join(glob.escape(self.path), "*.parquet")):
+                if os.path.basename(path) not in live:
+                    os.remove(path)
+
+    def _locate(self, row_ids):
+        # {month: row ids in it}, opening only the RowId column of months
+        # whose row id range covers one of the ids.
+        row_ids = np.asarray(row_ids, dtype="int64")
+        located = {}
+        for month, partition in self._load()["partitions"].items():
+            candidates = row_ids[(row_ids >= partition["min_row"]) & (row_ids <= partition["max_row"])]
+            if not len(candidates):
+                continue
+            stored = np.concatenate([
+                pd.read_parquet(self._file(name), columns=["RowId"])["RowId"].to_numpy() for name in partition["files"]
+            ])
+            found = candidates[np.isin(candidates, stored)]
+            if len(found):
+                located[month] = found
+        return located
+
+    def read_rows(self, row_ids):
+        with self._lock:
+            located = self._locate(row_ids)
+            data = self._read(sorted(located), COLUMNS)
+            return data.loc[data.index.intersection(row_ids)]
+
+    def update_cell(self, row_id, column, value):
+        if column not in COLUMNS:
+            raise KeyError(column)
+        with self._lock:
+            manifest = copy.deepcopy(self._load())
+            located = self._locate([row_id])
+            if not located:
+                raise KeyError(row_id)
+            (month,) = located
+            target = value.strftime("%Y-%m") if column == "Date" else month
+            self._check_writable(manifest, {month, target})
+            data = self._read_partition(manifest, month, COLUMNS)
+            data[column] = data[column].astype(object)
+            data.at[row_id, column] = value
+            data = normalize(data)
+            if target == month:
+                stale = self._replace_month(manifest, month, data)
+            else:
+                # The row moves to its new month's partition.
+                stale = self._replace_month(manifest, month, data.drop(index=[row_id]))
+                stale += self._add_to_month(manifest, target, data.loc[[row_id]])
+            self._commit(manifest, stale)
+
+    def delete_rows(self, row_ids):
+        with self._lock:
+            manifest = copy.deepcopy(self._load())
+            located = self._locate(row_ids)
+            self._check_writable(manifest, located)
+            stale = []
+            for month, found in located.items():
+                data = self._read_partition(manifest, month, COLUMNS)
+                stale += self._replace_month(manifest, month, data.drop(index=found))
+            self._commit(manifest, stale)
+
+    @instrumented("store.partitioned.group_totals", rows=result_rows)
+    def group_totals(self, keys, month=None):
+        # Month comes from the partition, so it costs no date parsing, and
+        # a month-scoped total reads one partition.
+        columns = [key for key in keys if key != "Month"] + ["Amount"]
+        with self._lock:
+            partitions = self._load()["partitions"]
+            months = sorted(partitions) if month is None else [str(month)] if str(month) in partitions else []
+            data = self._read_files([file for name in months for file in partitions[name]["files"]], columns)
+            if data is None:
+                data = normalize(pd.DataFrame(columns=columns), columns)
+            # Files are read in month order, so Month is each month repeated
+            # for its row count.
+            data["Month"] = pd.PeriodIndex(months, freq="M").repeat([partitions[name]["rows"] for name in months])
+        data["Amount"] = to_cents(data["Amount"])
+        totals = data.groupby(keys, observed=True, dropna=False)["Amount"].agg(["sum", "count"])
+        return totals.assign(sum=totals["sum"] / 100).rename(columns={"sum": "Amount", "count": "Count"})
+
+    def compact(self):
+        # Folds each month's appended files into one.
+        with self._lock:
+            manifest = copy.deepcopy(self._load())
+            stale = []
+            for month, partition in list(manifest["partitions"].items()):
+                if len(partition["files"]) > 1:
+                    stale += self._replace_month(manifest, month, self._read_partition(manifest, month, COLUMNS))
+            if stale:
+                self._commit(manifest, stale)
+
+    def freeze(self, through):
+        # Marks every month up to and including `through` read-only, after
+        # compacting it. Returns the months frozen.
+        through = str(pd.Period(through, freq="M"))
+        self.compact()
+        with self._lock:
+            manifest = copy.deepcopy(self._load())
+            frozen = [month for month, partition in sorted(manifest["partitions"].items())
+                      if month <= through and not partition["frozen"]]
+            for month in frozen:
+                manifest["partitions"][month]["frozen"] = True
+            if frozen:
+                self._save(manifest)
+            return frozen
+
+    def close(self):
+        self.compact()
+
+
+def default_store():
+    backend = os.environ.get("SPENDTRACKER_STORE", "parquet" if pq is not None else "csv")
+    if backend == "sqlite":
+        return SqliteSpendStore()
+    if backend == "partitioned":
+        return PartitionedSpendStore()
+    if backend == "parquet":
+        return ParquetSpendStore()
+    return CsvSpendStore()
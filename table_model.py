@@ -0,0 +1,170 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QThread, pyqtSignal
+import pandas as pd
+
+
+class LedgerTableModel(QAbstractTableModel):
+    # Grid model over the ledger frame: cells are formatted on demand, and
+    # ledger mutations become row-level Qt signals rather than a rebuild.
+    editFailed = pyqtSignal(str)
+    loadFailed = pyqtSignal(object)
+    reloadRequested = pyqtSignal()
+
+    # Removing more separate ranges than this is cheaper as a reset.
+    max_removed_ranges = 64
+
+    def __init__(self, spend_model, tasks=None, parent=None):
+        super().__init__(parent)
+        self.spend_model = spend_model
+        # TaskRunner for filtered loads; without one they run inline.
+        self.tasks = tasks
+        self.columns = spend_model.columns
+        # Keyword arguments for spend_model.query_row_ids(); empty shows
+        # every row.
+        self.filters = {}
+        self._frame = self._load()
+        self.reloadRequested.connect(self.reload)
+        spend_model.subscribe(self._ledger_event)
+
+    def detach(self):
+        self.spend_model.unsubscribe(self._ledger_event)
+
+    def _ledger_event(self, event, before, after):
+        # A worker's _sync() can notice the store changed on disk and reset
+        # the ledger from its own thread; Qt models may only change on the
+        # GUI thread, so that becomes a queued reload there.
+        if QThread.currentThread() is self.thread():
+            self.on_ledger_changed(event, before, after)
+        else:
+            self.reloadRequested.emit()
+
+    def _load(self):
+        if self.filters:
+            return self.spend_model.query(**self.filters)
+        return self.spend_model.load_data()
+
+    def set_filters(self, filters):
+        self.filters = dict(filters)
+        self.reload()
+
+    def row_id(self, row):
+        return self._frame.index[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._frame)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        value = self._frame.iat[index.row(), index.column()]
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        if isinstance(value, pd.Timestamp):
+            return value.strftime("%Y-%m-%d")
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        try:
+            self.spend_model.update_cell(self.row_id(index.row()), self.columns[index.column()], value)
+        except (ValueError, KeyError) as e:
+            self.editFailed.emit(f"Invalid input: {e}")
+            return False
+        self.spend_model.maybe_compact()
+        return True
+
+    def reload(self):
+        if self.filters and self.tasks is not None:
+            # A filtered query, and the index build behind the first one,
+            # can take seconds on a large ledger: the grid keeps its rows
+            # until the worker's result is swapped in.
+            filters = self.filters
+            self.tasks.submit("grid_query", lambda: self.spend_model.query(**filters), self._set_frame, self.loadFailed.emit)
+            return
+        if self.tasks is not None:
+            self.tasks.cancel("grid_query")
+        self._set_frame(self._load())
+
+    def _set_frame(self, frame):
+        self.beginResetModel()
+        self._frame = frame
+        self.endResetModel()
+
+    def on_ledger_changed(self, event, before, after):
+        if self.filters:
+            # Any change can move rows in or out of the filter.
+            self.reload()
+        elif event == "append":
+            first = len(self._frame)
+            self.beginInsertRows(QModelIndex(), first, first + len(after) - 1)
+            self._frame = self.spend_model.load_data()
+            self.endInsertRows()
+        elif event == "update":
+            rows = self._frame.index.get_indexer(after.index)
+            self._frame = self.spend_model.load_data()
+            for row in rows[rows >= 0]:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+        elif event == "delete":
+            self._remove_rows(before.index)
+        else:
+            self.reload()
+
+    def _remove_rows(self, row_ids):
+        rows = sorted(row for row in self._frame.index.get_indexer(row_ids) if row >= 0)
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        if len(ranges) > self.max_removed_ranges:
+            self.reload()
+            return
+        # Remove from the bottom up so earlier positions stay valid.
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._frame = pd.concat([self._frame.iloc[:first], self._frame.iloc[last + 1:]])
+            self.endRemoveRows()
+        self._frame = self.spend_model.load_data()
+
+
+class FrameTableModel(QAbstractTableModel):
+    # Read-only model over a small result frame, such as a summary pivot.
+    def __init__(self, frame, parent=None):
+        super().__init__(parent)
+        self.frame = frame
+        self._columns = [str(column) for column in frame.columns]
+        self._index = [str(label) for label in frame.index]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._index)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return str(self.frame.iat[index.row(), index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._columns[section]
+        return self._index[section]
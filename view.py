@@ -1,10 +1,19 @@
 from PyQt5.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QTabWidget, QHBoxLayout, QTableWidget, QLabel, QTableWidgetItem,
-    QPushButton, QScrollArea, QProgressBar, QFormLayout, QDialog, QInputDialog, QFileDialog, QLineEdit, QComboBox
+    QMainWindow, QWidget, QVBoxLayout, QTabWidget, QHBoxLayout, QTableView, QLabel,
+    QPushButton, QScrollArea, QProgressBar, QFormLayout, QDialog, QInputDialog, QFileDialog, QLineEdit, QComboBox,
+    QMessageBox, QShortcut
 )
+from PyQt5.QtCore import QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+
+
+# Filter bar periods, in days back from today.
+FILTER_PERIODS = {"All dates": None, "Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
 
 
 class SpendTrackerView(QMainWindow):
+    tabBuilt = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Monthly Spend Tracker")
@@ -16,25 +25,90 @@ class SpendTrackerView(QMainWindow):
 
         self.button_layout = QHBoxLayout()
         self.upload_button = QPushButton("Upload CSV/XLSX")
+        self.export_button = QPushButton("Export CSV")
         self.add_expense_button = QPushButton("Add Expense Manually")
         self.credit_limit_button = QPushButton("Set Payment Method")
+        self.rules_button = QPushButton("Categorization Rules")
         self.show_summary_button = QPushButton("Show Summary")
         self.delete_row_button = QPushButton("Delete Selected Row")
         self.delete_all_button = QPushButton("Delete All Data")
 
         for btn in [
-            self.upload_button, self.add_expense_button, self.credit_limit_button,
-            self.show_summary_button, self.delete_row_button, self.delete_all_button
+            self.upload_button, self.export_button, self.add_expense_button, self.credit_limit_button,
+            self.rules_button, self.show_summary_button, self.delete_row_button, self.delete_all_button
         ]:
             self.button_layout.addWidget(btn)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["Date", "Source", "Description", "Category", "Spender", "Amount"])
+        self.filter_layout = QHBoxLayout()
+        self.filter_period = QComboBox()
+        self.filter_period.addItems(list(FILTER_PERIODS))
+        self.filter_category = QComboBox()
+        self.filter_spender = QComboBox()
+        self.filter_source = QComboBox()
+        self.set_filter_choices([], [], [])
+        self.filter_search = QLineEdit()
+        self.filter_search.setPlaceholderText('Search descriptions, e.g. coff "blue bottle"')
+        self.filter_search.setClearButtonEnabled(True)
+        self.filter_search.setMinimumWidth(240)
+        # Fires once typing pauses, rather than on every keystroke.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.filter_search.textChanged.connect(self.search_timer.start)
+        self.filter_clear_button = QPushButton("Clear Filters")
+        self.filter_layout.addWidget(QLabel("Show:"))
+        for widget in [
+            self.filter_period, self.filter_category, self.filter_spender, self.filter_source, self.filter_search,
+            self.filter_clear_button
+        ]:
+            self.filter_layout.addWidget(widget)
+        self.filter_layout.addStretch()
+
+        self.table = QTableView()
+
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setMaximumWidth(200)
+        self.cancel_task_button = QPushButton("Cancel")
+        self.statusBar().addPermanentWidget(self.busy_bar)
+        self.statusBar().addPermanentWidget(self.cancel_task_button)
+        self.set_busy(False)
+        self.alert_box = None
+        self.metrics_dialog = None
+        self.metrics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+M"), self)
 
         self.tabs = QTabWidget()
+        self.layout.addLayout(self.button_layout)
+        self.layout.addLayout(self.filter_layout)
+        self.layout.addWidget(self.table)
+        self.layout.addWidget(self.tabs)
 
-        self.summary_tab = QWidget()
+        # Tab contents are built the first time a tab is shown; tabBuilt
+        # tells the controller when it can wire up that tab's buttons.
+        self.built_tabs = set()
+        self._table_models = {}
+        self._tab_names = []
+        self._tab_builders = {}
+        self.summary_tab = self._add_lazy_tab("summary", "Summary", self._build_summary_tab)
+        self.insights_tab = self._add_lazy_tab("insights", "Spend Insights", self._build_insights_tab)
+        self.budget_tab = self._add_lazy_tab("budget", "Budget Tracking", self._build_budget_tab)
+        self.tabs.currentChanged.connect(lambda index: self.ensure_tab(self._tab_names[index]))
+        self.ensure_tab(self._tab_names[self.tabs.currentIndex()])
+
+    def _add_lazy_tab(self, name, title, build):
+        tab = QWidget()
+        self._tab_names.append(name)
+        self._tab_builders[name] = build
+        self.tabs.addTab(tab, title)
+        return tab
+
+    def ensure_tab(self, name):
+        if name in self.built_tabs:
+            return
+        self._tab_builders[name]()
+        self.built_tabs.add(name)
+        self.tabBuilt.emit(name)
+
+    def _build_summary_tab(self):
         self.summary_tab_layout = QVBoxLayout(self.summary_tab)
 
         self.summary_button_layout = QHBoxLayout()
@@ -67,13 +141,7 @@ class SpendTrackerView(QMainWindow):
         self.summary_tab_layout.addLayout(self.summary_button_layout)
         self.summary_tab_layout.addWidget(self.summary_scroll)
 
-        self.tabs.addTab(self.summary_tab, "Summary")
-
-        self.layout.addLayout(self.button_layout)
-        self.layout.addWidget(self.table)
-        self.layout.addWidget(self.tabs)
-
-        self.insights_tab = QWidget()
+    def _build_insights_tab(self):
         self.insights_tab_layout = QVBoxLayout(self.insights_tab)
 
         self.insights_button_layout = QHBoxLayout()
@@ -98,14 +166,9 @@ class SpendTrackerView(QMainWindow):
         self.insights_tab_layout.addLayout(self.insights_button_layout)
         self.insights_tab_layout.addWidget(self.insights_scroll)
 
-        self.tabs.addTab(self.insights_tab, "Spend Insights")
-
-        self.budget_tab = QWidget()
+    def _build_budget_tab(self):
         self.budget_tab_layout = QVBoxLayout(self.budget_tab)
 
-        self.tabs.addTab(self.budget_tab, "Budget Tracking")
-
-        
         self.budget_button_set_limit = QPushButton("Set Budget Limit")
         self.budget_button_summary = QPushButton("Show Budget Summary")
 
@@ -125,9 +188,99 @@ class SpendTrackerView(QMainWindow):
         self.budget_tab_layout.addWidget(self.budget_scroll)
 
 
+    def _filter_combos(self):
+        return [
+            (self.filter_category, "All categories"), (self.filter_spender, "All spenders"),
+            (self.filter_source, "All cards"),
+        ]
+
+    def set_filter_choices(self, categories, spenders, sources):
+        # Keeps the current selections where they are still offered.
+        for (combo, everything), values in zip(self._filter_combos(), [categories, spenders, sources]):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(everything)
+            combo.addItems(values)
+            combo.setCurrentIndex(max(combo.findText(current), 0))
+            combo.blockSignals(False)
+
+    def filter_selection(self):
+        # (days back, category, spender, source, search text), with None
+        # for "all".
+        values = [combo.currentText() if combo.currentIndex() > 0 else None for combo, _ in self._filter_combos()]
+        text = self.filter_search.text().strip() or None
+        return (FILTER_PERIODS[self.filter_period.currentText()], *values, text)
+
+    def clear_filters(self):
+        for combo in [self.filter_period] + [combo for combo, _ in self._filter_combos()]:
+            combo.setCurrentIndex(0)
+        self.filter_search.clear()
+
+    def set_busy(self, busy):
+        # Indeterminate until a task reports progress.
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setVisible(busy)
+        self.cancel_task_button.setVisible(busy)
+
+    def set_progress(self, percent):
+        self.busy_bar.setRange(0, 100)
+        self.busy_bar.setValue(percent)
+
+    def show_alerts(self, messages):
+        # Non-modal, so an import that trips a limit keeps running.
+        self.statusBar().showMessage(messages[-1], 10000)
+        if self.alert_box is not None:
+            self.alert_box.close()
+        self.alert_box = QMessageBox(QMessageBox.Warning, "Limit Exceeded", "\n".join(messages), QMessageBox.Ok, self)
+        self.alert_box.setModal(False)
+        self.alert_box.show()
+
+    def show_metrics(self, table_model, notes):
+        # Debug panel; reopening it replaces the previous snapshot.
+        if self.metrics_dialog is not None:
+            self.metrics_dialog.close()
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Performance Metrics")
+        dialog.resize(900, 500)
+        layout = QVBoxLayout(dialog)
+        table = QTableView()
+        table.setModel(table_model)
+        table.resizeColumnsToContents()
+        layout.addWidget(table)
+        layout.addWidget(QLabel(notes))
+        self._table_models["metrics"] = [table_model]
+        self.metrics_dialog = dialog
+        dialog.show()
+
     def open_file_dialog(self):
         return QFileDialog.getOpenFileName(self, "Open File", "", "CSV Files (*.csv);;Excel Files (*.xlsx)")[0]
 
+    def ask_import_mode(self):
+        box = QMessageBox(self)
+        box.setWindowTitle("Import Statement")
+        box.setText("Add the statement to the existing expenses, or replace them?")
+        merge_button = box.addButton("Merge", QMessageBox.AcceptRole)
+        replace_button = box.addButton("Replace", QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.exec_()
+        if box.clickedButton() is merge_button:
+            return "merge"
+        if box.clickedButton() is replace_button:
+            return "replace"
+        return None
+
+    def ask_import_duplicates(self, count):
+        answer = QMessageBox.question(
+            self, "Import Statement",
+            f"{count} rows are already in the expenses and were skipped. Import them anyway?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        return answer == QMessageBox.Yes
+
+    def save_file_dialog(self):
+        return QFileDialog.getSaveFileName(self, "Export File", "spend_data.csv", "CSV Files (*.csv)")[0]
+
     def ask_for_card_limit(self, card_name):
         if not card_name == "cash":
             card_type, ok = QInputDialog.getItem(
@@ -145,26 +298,29 @@ class SpendTrackerView(QMainWindow):
             else:
                 return None, False
 
-    def clear_summary_scroll(self):
-        for i in reversed(range(self.summary_scroll_layout.count())):
-            widget = self.summary_scroll_layout.itemAt(i).widget()
-            if widget:
+    def _clear_layout(self, layout):
+        for i in reversed(range(layout.count())):
+            widget = layout.itemAt(i).widget()
+            if widget and widget.property("reusable"):
+                # Owned elsewhere (chart canvases): detach, don't delete.
+                layout.removeWidget(widget)
+                widget.setParent(None)
+            elif widget:
                 widget.deleteLater()
 
-    def add_table_to_summary(self, title, table_data):
+    def clear_summary_scroll(self):
+        self.ensure_tab("summary")
+        self._clear_layout(self.summary_scroll_layout)
+        self._table_models.pop("summary", None)
+
+    def add_table_to_summary(self, title, table_model):
         label = QLabel(title)
         self.summary_scroll_layout.addWidget(label)
 
-        table = QTableWidget()
-        table.setRowCount(len(table_data))
-        table.setColumnCount(len(table_data.columns))
-        table.setHorizontalHeaderLabels([str(col) for col in table_data.columns])
-        table.setVerticalHeaderLabels([str(idx) for idx in table_data.index])
-
-        for i, row in enumerate(table_data.itertuples()):
-            for j, value in enumerate(row[1:]):  # Skip the first item (index)
-                table.setItem(i, j, QTableWidgetItem(str(value)))
-
+        table = QTableView()
+        table.setModel(table_model)
+        # setModel() doesn't keep the model alive.
+        self._table_models.setdefault("summary", []).append(table_model)
         self.summary_scroll_layout.addWidget(table)
 
     def add_chart_to_summary(self, title, chart_widget):
@@ -231,25 +387,18 @@ class SpendTrackerView(QMainWindow):
         return dialog
     
     def clear_insights_scroll(self):
-        for i in reversed(range(self.insights_scroll_layout.count())):
-            widget = self.insights_scroll_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
+        self.ensure_tab("insights")
+        self._clear_layout(self.insights_scroll_layout)
+        self._table_models.pop("insights", None)
 
-    def add_table_to_insights(self, title, table_data):
+    def add_table_to_insights(self, title, table_model):
         label = QLabel(title)
         self.insights_scroll_layout.addWidget(label)
 
-        table = QTableWidget()
-        table.setRowCount(len(table_data))
-        table.setColumnCount(len(table_data.columns))
-        table.setHorizontalHeaderLabels([str(col) for col in table_data.columns])
-        table.setVerticalHeaderLabels([str(idx) for idx in table_data.index])
-
-        for i, row in enumerate(table_data.itertuples()):
-            for j, value in enumerate(row[1:]):  # Skip the first item (index)
-                table.setItem(i, j, QTableWidgetItem(str(value)))
-
+        table = QTableView()
+        table.setModel(table_model)
+        # setModel() doesn't keep the model alive.
+        self._table_models.setdefault("insights", []).append(table_model)
         self.insights_scroll_layout.addWidget(table)
 
     def add_chart_to_insights(self, title, chart_widget):
@@ -259,10 +408,8 @@ class SpendTrackerView(QMainWindow):
         self.insights_scroll_layout.addWidget(chart_widget)
 
     def clear_budget_scroll(self):
-        for i in reversed(range(self.budget_scroll_layout.count())):
-            widget = self.budget_scroll_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
+        self.ensure_tab("budget")
+        self._clear_layout(self.budget_scroll_layout)
 
     def add_budget_summary(self, budget_summary):
         for category, details in budget_summary.items():
@@ -0,0 +1,202 @@
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, Qt, pyqtSignal
+
+from metrics import registry
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+def _capture(fn, args):
+    try:
+        return True, fn(*args)
+    except Exception as e:
+        return False, e
+
+
+class _GuiCall:
+    # A call a worker hands to the GUI thread. Until the GUI thread starts
+    # it, the worker can withdraw it.
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.lock = threading.Lock()
+        self.started = False
+        self.withdrawn = False
+        self.done = threading.Event()
+        self.outcome = None
+
+    def __call__(self):
+        with self.lock:
+            if self.withdrawn:
+                return
+            self.started = True
+        self.outcome = _capture(self.fn, self.args)
+        self.done.set()
+
+    def withdraw(self):
+        with self.lock:
+            self.withdrawn = not self.started
+            return self.withdrawn
+
+
+class Task(QRunnable):
+    def __init__(self, runner, key, generation, fn, pass_task):
+        super().__init__()
+        self.runner = runner
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.pass_task = pass_task
+        self.cancelled = False
+        # Set when submitted from a measured operation; see _on_finished().
+        self.operation = registry.current()
+        self.submitted = time.perf_counter()
+
+    def report_progress(self, percent):
+        self.runner._progress.emit(self.key, self.generation, int(percent))
+
+    def run(self):
+        if self.cancelled:
+            # Lets a task submitted with on_cancelled report that it stopped.
+            self.runner._finished.emit(self.key, self.generation, None)
+            return
+        try:
+            result = self.fn(self) if self.pass_task else self.fn()
+        except Exception as e:
+            self.runner._failed.emit(self.key, self.generation, e)
+            return
+        self.runner._finished.emit(self.key, self.generation, result)
+
+
+class TaskRunner(QObject):
+    # Runs work on a QThreadPool and hands results back on the GUI thread.
+    # Tasks are grouped by key: submitting a new task under a key supersedes
+    # the previous one, whose result is then dropped.
+    busyChanged = pyqtSignal(bool)
+    progressChanged = pyqtSignal(int)
+
+    _finished = pyqtSignal(str, int, object)
+    _failed = pyqtSignal(str, int, object)
+    _progress = pyqtSignal(str, int, int)
+    _invoke = pyqtSignal(object)
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool()
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self._generation = 0
+        self._current = {}
+        # Cancelled tasks that report back when they stop, by generation.
+        self._stopping = {}
+
+        self._finished.connect(self._on_finished, Qt.QueuedConnection)
+        self._failed.connect(self._on_failed, Qt.QueuedConnection)
+        self._progress.connect(self._on_progress, Qt.QueuedConnection)
+        self._invoke.connect(self._on_invoke, Qt.QueuedConnection)
+
+    def submit(self, key, fn, on_result, on_error=None, on_progress=None, pass_task=False, on_cancelled=None):
+        # With pass_task=True, fn receives the Task so it can poll
+        # task.cancelled and call task.report_progress(). on_cancelled, if
+        # given, is called with fn's result (None if it never ran) when the
+        # task stops after cancel(); superseded tasks are dropped silently.
+        was_busy = self.is_busy()
+        previous = self._current.get(key)
+        if previous:
+            previous[0].cancelled = True
+
+        self._generation += 1
+        task = Task(self, key, self._generation, fn, pass_task)
+        self._current[key] = (task, on_result, on_error, on_progress, on_cancelled)
+        self.pool.start(task)
+        if not was_busy:
+            self.busyChanged.emit(True)
+        return task
+
+    def call_in_gui_thread(self, fn, *args, task=None):
+        # Lets a worker hand a model mutation to the GUI thread and wait for
+        # it, so ledger listeners (Qt models included) only run on that thread.
+        # Once task is cancelled, a call the GUI thread hasn't started is
+        # withdrawn and TaskCancelled raised: the GUI thread may itself be
+        # waiting for the task to end.
+        if QThread.currentThread() is self.thread():
+            return fn(*args)
+        call = _GuiCall(fn, args)
+        self._invoke.emit(call)
+        while not call.done.wait(0.05):
+            if task is not None and task.cancelled and call.withdraw():
+                raise TaskCancelled()
+        ok, value = call.outcome
+        if not ok:
+            raise value
+        return value
+
+    def _on_invoke(self, call):
+        call()
+
+    def cancel(self, key):
+        entry = self._current.pop(key, None)
+        if entry:
+            entry[0].cancelled = True
+            if entry[4]:
+                self._stopping[entry[0].generation] = entry
+            self._update_busy()
+
+    def cancel_all(self):
+        for key in list(self._current):
+            self.cancel(key)
+
+    def shutdown(self):
+        # Cancels every task without reporting back and waits for the
+        # workers to stop.
+        self.cancel_all()
+        self._stopping.clear()
+        self.pool.waitForDone()
+
+    def is_busy(self):
+        return bool(self._current)
+
+    def _update_busy(self):
+        if not self._current:
+            self.busyChanged.emit(False)
+
+    def _take(self, key, generation):
+        entry = self._current.get(key)
+        if entry is None or entry[0].generation != generation:
+            return None
+        del self._current[key]
+        return entry
+
+    def _on_finished(self, key, generation, result):
+        entry = self._take(key, generation)
+        if entry is None:
+            stopped = self._stopping.pop(generation, None)
+            if stopped:
+                stopped[4](result)
+            return
+        self._update_busy()
+        entry[1](result)
+        task = entry[0]
+        if task.operation:
+            # From the click to the result being drawn.
+            registry.record(f"{task.operation} (end to end)", time.perf_counter() - task.submitted)
+
+    def _on_failed(self, key, generation, error):
+        entry = self._take(key, generation) or self._stopping.pop(generation, None)
+        if entry is None:
+            return
+        self._update_busy()
+        if entry[2]:
+            entry[2](error)
+
+    def _on_progress(self, key, generation, percent):
+        entry = self._current.get(key)
+        if entry is None or entry[0].generation != generation:
+            return
+        self.progressChanged.emit(percent)
+        if entry[3]:
+            entry[3](percent)